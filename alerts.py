@@ -0,0 +1,171 @@
+"""Оповещения о превышении порогов — проверяются при записи каждого показания.
+
+Правило срабатывает, когда значение выше above дольше for_ms (подавление
+дребезга), и снимается, когда значение ниже clear_below (гистерезис) тоже
+дольше for_ms. Состояние хранится только для устройств, у которых правило
+сработало или вот-вот сработает, поэтому проверка показания — O(число
+правил), без запросов к logs. Переходы (firing/resolved) пишутся в таблицу
+alerts и рассылаются подписчикам.
+
+Пороги CO2 — единые для оповещений, карточек статистики и цветов на
+страницах: CO2_WARN_PPM (по умолчанию 800) и CO2_HIGH_PPM (1200).
+Свои правила можно задать в ALERT_RULES (JSON):
+
+    [{"name": "temp_high", "field": "temp", "level": "warning", "above": 30, "clear_below": 28, "for_s": 300}]
+"""
+import json
+import os
+import threading
+
+CO2_WARN_PPM = float(os.getenv("CO2_WARN_PPM", 800))
+CO2_HIGH_PPM = float(os.getenv("CO2_HIGH_PPM", 1200))
+CO2_HYSTERESIS_PPM = float(os.getenv("CO2_HYSTERESIS_PPM", 50))
+ALERT_DEBOUNCE_S = float(os.getenv("ALERT_DEBOUNCE_S", 60))
+
+# Показания CO2 приходят в % объёма: 1% = 10000 ppm
+CO2_WARN = CO2_WARN_PPM / 10000
+CO2_HIGH = CO2_HIGH_PPM / 10000
+
+# Поле правила -> индекс в строке logs (device_id, ts, source_ip, co2, temp, status)
+FIELDS = {"co2": 3, "temp": 4}
+
+
+class Rule:
+    __slots__ = ("name", "field", "index", "level", "above", "clear_below", "for_ms")
+
+    def __init__(self, name, field, level, above, clear_below=None, for_s=0):
+        if field not in FIELDS:
+            raise ValueError(f"unknown field {field!r} in rule {name!r}")
+        self.name = name
+        self.field = field
+        self.index = FIELDS[field]
+        self.level = level
+        self.above = above
+        self.clear_below = above if clear_below is None else clear_below
+        self.for_ms = int(for_s * 1000)
+
+    def as_dict(self):
+        return {
+            "name": self.name, "field": self.field, "level": self.level, "above": self.above,
+            "clear_below": self.clear_below, "for_s": self.for_ms / 1000,
+        }
+
+
+def default_rules():
+    hysteresis = CO2_HYSTERESIS_PPM / 10000
+    return [
+        Rule("co2_warning", "co2", "warning", CO2_WARN, CO2_WARN - hysteresis, ALERT_DEBOUNCE_S),
+        Rule("co2_high", "co2", "critical", CO2_HIGH, CO2_HIGH - hysteresis, ALERT_DEBOUNCE_S),
+    ]
+
+
+def load_rules():
+    raw = os.getenv("ALERT_RULES")
+    if not raw:
+        return default_rules()
+    return [Rule(**rule) for rule in json.loads(raw)]
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            level TEXT NOT NULL,
+            state TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            value REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_device_rule ON alerts(device_id, rule, id);')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(ts);')
+
+
+INSERT_SQL = '''
+    INSERT INTO alerts (device_id, rule, level, state, ts, value)
+    VALUES (:device_id, :rule, :level, :state, :ts, :value)
+'''
+
+# Последний переход каждой пары (устройство, правило), если он "firing"
+ACTIVE_SQL = '''
+    SELECT device_id, rule, level, state, ts, value FROM alerts
+    WHERE id IN (SELECT MAX(id) FROM alerts GROUP BY device_id, rule) AND state = 'firing'
+    ORDER BY ts DESC
+'''
+
+
+class AlertEngine:
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else load_rules()
+        # (device_id, правило) -> [сработало, выше порога с, ниже порога снятия с]
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(1 for state in self._state.values() if state[0])
+
+    def load(self, active):
+        """Восстанавливает сработавшие правила из ACTIVE_SQL после перезапуска."""
+        names = {rule.name for rule in self.rules}
+        with self._lock:
+            self._state = {(a["device_id"], a["rule"]): [True, a["ts"], None]
+                           for a in active if a["rule"] in names}
+
+    def evaluate(self, rows):
+        """Проверяет строки logs по порядку, не меняя состояние движка.
+
+        Возвращает (переходы — словари для INSERT_SQL, изменения состояния).
+        Изменения применяет apply() после успешной записи пачки: если запись
+        не удалась, состояние остаётся прежним и переходы не теряются.
+        """
+        events = []
+        # (device_id, правило) -> новое состояние (копия) или None, если его нужно удалить
+        changes = {}
+        with self._lock:
+            for row in rows:
+                device_id, ts = row[0], row[1]
+                for rule in self.rules:
+                    value = row[rule.index]
+                    if value is None:
+                        continue
+                    key = (device_id, rule.name)
+                    if key in changes:
+                        state = changes[key]
+                    else:
+                        state = self._state.get(key)
+                        if state is not None:
+                            state = changes[key] = list(state)
+                    if state is None or not state[0]:
+                        if value <= rule.above:
+                            if state is not None:
+                                changes[key] = None
+                            continue
+                        if state is None:
+                            state = changes[key] = [False, ts, None]
+                        if ts - state[1] >= rule.for_ms:
+                            state[0], state[2] = True, None
+                            events.append(self._event(device_id, rule, "firing", ts, value))
+                    elif value < rule.clear_below:
+                        if state[2] is None:
+                            state[2] = ts
+                        if ts - state[2] >= rule.for_ms:
+                            changes[key] = None
+                            events.append(self._event(device_id, rule, "resolved", ts, value))
+                    else:
+                        state[2] = None
+        return events, changes
+
+    def apply(self, changes):
+        """Применяет изменения состояния из evaluate() — после записи пачки."""
+        with self._lock:
+            for key, state in changes.items():
+                if state is None:
+                    self._state.pop(key, None)
+                else:
+                    self._state[key] = state
+
+    @staticmethod
+    def _event(device_id, rule, state, ts, value):
+        return {"device_id": device_id, "rule": rule.name, "level": rule.level,
+                "state": state, "ts": ts, "value": value}
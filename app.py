@@ -1,316 +1,585 @@
 import os
 import json
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template_string
-import sqlite3
+import time
+import hashlib
+import atexit
+import threading
+from flask import Flask, Response, request, jsonify, g, render_template
+import rollups
+import metrics
+import storage
+import alerts
+import bulk
+import downsample
+import retention
+import snapshot
+from retention import RetentionScheduler
+from recent import RecentStore, Reading
+from window_stats import WindowStats
+from cache import ResponseCache
+from pubsub import PubSub, ALL, ALERTS, device_topic
 from dashboard import device_dashboard_page  # ← Импорт из отдельного файла
+from ingest import WriteBehindQueue, QueueFull
+from normalize import build_row, normalize_batch
+from writer import WriterClient, WRITER_SOCKET_ENV
+from log import get_logger, counters
+
+log = get_logger("app")
 
 # === Настройки ===
 WEB_PORT = int(os.getenv("PORT", 5000))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))   # максимум строк в очереди записи
+INGEST_BATCH_ROWS = int(os.getenv("INGEST_BATCH_ROWS", 500))     # строк в одной транзакции
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", 200))         # как часто сбрасывать очередь
+BATCH_MAX_READINGS = int(os.getenv("BATCH_MAX_READINGS", 1000))  # лимит для /api/log/batch
+INGEST_WRITER_SOCKET = os.getenv(WRITER_SOCKET_ENV)               # задаёт gunicorn.conf.py
+INGEST_SHUTDOWN_WAIT_S = float(os.getenv("INGEST_SHUTDOWN_WAIT_S", 10))  # ждать писателя при остановке
+RECENT_PER_DEVICE = int(os.getenv("RECENT_PER_DEVICE", 100))     # показаний на устройство в памяти
+RECENT_MAX_DEVICES = int(os.getenv("RECENT_MAX_DEVICES", 20000)) # устройств в памяти (LRU)
+PAGE_CACHE_TTL_S = float(os.getenv("PAGE_CACHE_TTL_S", 30))      # максимальный возраст страницы
+PAGE_CACHE_MIN_AGE_S = float(os.getenv("PAGE_CACHE_MIN_AGE_S", 2))  # не перерисовывать чаще
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", 5000))
+# Под gunicorn (gthread) каждый поток держит поток воркера: не больше четверти потоков,
+# чтобы на остальные запросы хватало. В ASGI-режиме (asgi.py) действует только SSE_MAX_SUBSCRIBERS
+SSE_MAX_THREAD_STREAMS = int(os.getenv("SSE_MAX_THREAD_STREAMS", max(1, int(os.getenv("GUNICORN_THREADS", 64)) // 4)))
+SSE_CLIENT_QUEUE = int(os.getenv("SSE_CLIENT_QUEUE", 1000))      # устройств в очереди клиента
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", 15))
+SSE_MAX_STREAM_S = float(os.getenv("SSE_MAX_STREAM_S", 300))     # потом клиент переподключается
+DEVICES_PAGE_DEFAULT = int(os.getenv("DEVICES_PAGE_DEFAULT", 100)) # устройств на странице /api/devices
+DEVICES_PAGE_MAX = int(os.getenv("DEVICES_PAGE_MAX", 1000))
+SERIES_DEFAULT_POINTS = int(os.getenv("SERIES_DEFAULT_POINTS", 500))
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", 5000))     # лимит points для /series
 
 # === Инициализация БД ===
+# SQLite или PostgreSQL — по DATABASE_URL (storage.py)
+store = storage.open_storage()
+# Запросы страниц дашборда — из снимка основной базы при READ_SNAPSHOT_S > 0 (snapshot.py),
+# запись и прогрев при старте — всегда из store
+reader = snapshot.open_reader(store)
+
 def init_db():
-    conn = sqlite3.connect("co2_devices.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            device_id TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            source_ip TEXT NOT NULL,
-            co2 REAL,
-            temp INTEGER,
-            status TEXT
-        )
-    ''')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_device ON logs(device_id);')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON logs(timestamp);')
-    conn.commit()
-    conn.close()
-    print("✅ БД инициализирована")
-
-def get_db_connection():
-    conn = sqlite3.connect("co2_devices.db")
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def save_to_db(device_id, ip, payload):
-    try:
-        co2 = float(payload["co2"]) if "co2" in payload and payload["co2"] is not None else None
-        temp_raw = payload.get("temp")
-        temp = None
-        if temp_raw is not None:
-            try:
-                temp = int(float(temp_raw))
-            except (ValueError, TypeError):
-                temp = None
-        status = str(payload.get("status", ""))[:20]
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        timestamp = datetime.utcnow().isoformat() + "Z"
-        cursor.execute('''
-            INSERT INTO logs (device_id, timestamp, source_ip, co2, temp, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (device_id, timestamp, ip, co2, temp, status))
-        conn.commit()
-        conn.close()
-        print(f"💾 Сохранено: {device_id} | CO2={co2} | Temp={temp} | Status={status}")
-    except Exception as e:
-        print(f"❌ Ошибка сохранения: {e}")
+    applied = store.migrate()
+    if applied:
+        log.info("🔧 Применены миграции", extra={"applied": applied})
+    log.info("✅ БД инициализирована", extra={"storage": store.name})
+
+# === Метрики (/metrics) ===
+DB_QUERY_SECONDS = metrics.histogram("co2_db_query_seconds", "Time spent in DB functions", ["func"])
+WRITE_BATCH_ROWS = metrics.histogram("co2_write_batch_rows", "Rows per committed write batch",
+                                     buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
+INGEST_READINGS = metrics.counter("co2_ingest_readings_total", "Readings received, by result", ["result"])
+HTTP_REQUEST_SECONDS = metrics.histogram("co2_http_request_seconds", "HTTP request handling time", ["endpoint"])
+HTTP_RESPONSES = metrics.counter("co2_http_responses_total", "HTTP responses", ["endpoint", "status"])
+ALERT_TRANSITIONS = metrics.counter("co2_alert_transitions_total", "Alert transitions", ["rule", "state"])
+PAGE_RENDER_SECONDS = metrics.histogram("co2_page_render_seconds", "Page render time on cache miss", ["endpoint"])
+
+# === Кэш отрисованных страниц ===
+page_cache = ResponseCache(
+    ttl=PAGE_CACHE_TTL_S,
+    min_age=PAGE_CACHE_MIN_AGE_S,
+    on_render=lambda endpoint, seconds: PAGE_RENDER_SECONDS.observe(seconds, endpoint=endpoint),
+)
+
+# === Рассылка новых показаний (SSE) ===
+pubsub = PubSub(max_subscribers=SSE_MAX_SUBSCRIBERS)
+
+def publish_readings(rows):
+    """Отправляет подписчикам последнее показание каждого устройства из пачки."""
+    if not len(pubsub):
+        return
+    for row in rows:
+        message = json.dumps(Reading(*row).as_dict())
+        pubsub.publish(ALL, row[0], message)
+        pubsub.publish(device_topic(row[0]), row[0], message)
+
+def publish_alerts(events):
+    if not len(pubsub):
+        return
+    for event in events:
+        pubsub.publish(ALERTS, (event["device_id"], event["rule"]), json.dumps(event))
+
+# === Последние показания в памяти ===
+recent_store = RecentStore(per_device=RECENT_PER_DEVICE, max_devices=RECENT_MAX_DEVICES)
+
+def warm_recent_store():
+    # Самые свежие устройства добавляются последними — их LRU вытеснит позже всех
+    recent_store.warm(store.recent_devices(RECENT_MAX_DEVICES))
+    log.info("🔥 Последние показания загружены в память", extra={"devices": len(recent_store)})
+
+# === Статистика для шапки главной страницы (окно 10 минут) ===
+window_stats = WindowStats(window_ms=10 * 60 * 1000, bucket_ms=rollups.ROLLUPS["rollup_1m"], high_co2=alerts.CO2_HIGH)
+
+def warm_window_stats():
+    latest = [(row[0], row[1], row[3]) for row in store.latest_per_device()]
+    since = int(time.time() * 1000) - window_stats.window_ms - window_stats.bucket_ms
+    window_stats.load(latest, store.temp_buckets(since))
+
+# === Оповещения (проверяются там, где пишется БД) ===
+alert_engine = alerts.AlertEngine()
+
+def warm_alert_engine():
+    alert_engine.load(store.active_alerts())
+
+def persist_rows(rows):
+    """Записывает пачку строк в logs, обновляет device_latest и rollup-таблицы (storage.py).
+
+    Возвращает переходы оповещений, записанные в той же транзакции.
+    """
+    # Для device_latest достаточно последней строки каждого устройства в пачке
+    latest = {row[0]: row for row in rows}.values()
+    alert_events, alert_changes = alert_engine.evaluate(rows)
+    store.insert_batch(rows, latest, alert_events)
+    # Состояние оповещений меняется только после записи — иначе при ошибке переходы потерялись бы
+    alert_engine.apply(alert_changes)
+    counters.add("rows_saved", len(rows))
+    counters.add("batches_saved")
+    return alert_events
+
+def record_write(rows, alert_events, seconds):
+    """Метрики записанной пачки.
+
+    Пишет в БД процесс-писатель, у которого нет /metrics, поэтому время записи
+    он присылает в кадре вместе со строками, а метрики ведёт каждый воркер.
+    """
+    DB_QUERY_SECONDS.observe(seconds, func="persist_rows")
+    WRITE_BATCH_ROWS.observe(len(rows))
+    for event in alert_events:
+        ALERT_TRANSITIONS.inc(rule=event["rule"], state=event["state"])
+
+def on_rows_saved(rows, alert_events=(), write_seconds=None):
+    """Обновляет состояние процесса после записи: метрики, память, кэш страниц, подписчиков."""
+    if write_seconds is not None:
+        record_write(rows, alert_events, write_seconds)
+    recent_store.add_rows(rows)
+    window_stats.add_rows(rows)
+    page_cache.invalidate()
+    publish_readings({row[0]: row for row in rows}.values())
+    publish_alerts(alert_events)
+
+def save_rows_to_db(rows):
+    started = time.perf_counter()
+    alert_events = persist_rows(rows)
+    on_rows_saved(rows, alert_events, time.perf_counter() - started)
+
+# === Очередь отложенной записи ===
+# С INGEST_WRITER_SOCKET пачки уходят единственному процессу-писателю (writer.py),
+# а записанные строки всех воркеров приходят обратно в on_rows_saved
+if INGEST_WRITER_SOCKET:
+    writer_client = WriterClient(INGEST_WRITER_SOCKET, on_rows=on_rows_saved)
+    flush_rows = writer_client.send_rows
+else:
+    writer_client = None
+    flush_rows = save_rows_to_db
+
+ingest_queue = WriteBehindQueue(
+    flush_rows,
+    max_size=INGEST_QUEUE_SIZE,
+    batch_rows=INGEST_BATCH_ROWS,
+    flush_interval=INGEST_FLUSH_MS / 1000,
+    # Пачку, которую не удалось записать, пишем по частям; отправку писателю не делим
+    split_failed=writer_client is None,
+)
+
+def close_ingest_queue():
+    """Дописывает очередь при остановке; недоступного писателя ждём не дольше INGEST_SHUTDOWN_WAIT_S."""
+    if writer_client is not None:
+        writer_client.close(INGEST_SHUTDOWN_WAIT_S)
+    ingest_queue.close()
+
+atexit.register(close_ingest_queue)
 
 # === Flask App ===
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    started = g.get("request_started")
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    HTTP_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def get_client_ip():
+    return request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0].strip()
+
+# Логика приёма не зависит от Flask — её же вызывает ASGI-вход (asgi.py).
+# Возвращает (код ответа, тело, заголовки).
+def queue_full_response(e):
+    counters.add("ingest_rejected_queue_full")
+    log.warning("⚠️ Очередь записи переполнена", extra={"error": str(e)})
+    return 429, {"error": "Too many requests, retry later"}, {"Retry-After": "1"}
+
+def ingest_reading(payload, ip):
+    if not payload or not isinstance(payload, dict):
+        INGEST_READINGS.inc(result="invalid")
+        return 400, {"error": "Invalid JSON"}, {}
+    device_id = payload.get("device", ip)
+    try:
+        row = build_row(device_id, ip, payload)
+    except (ValueError, TypeError, OverflowError) as e:
+        INGEST_READINGS.inc(result="invalid")
+        return 400, {"error": f"Invalid reading: {e}"}, {}
+    try:
+        ingest_queue.put(row)
+    except QueueFull as e:
+        INGEST_READINGS.inc(result="queue_full")
+        return queue_full_response(e)
+    INGEST_READINGS.inc(result="accepted")
+    return 200, {"status": "ok"}, {}
+
+def ingest_batch(payload, ip):
+    readings = payload.get("readings") if isinstance(payload, dict) else payload
+    if not isinstance(readings, list) or not readings:
+        return 400, {"error": "Expected a non-empty array of readings"}, {}
+    if len(readings) > BATCH_MAX_READINGS:
+        return 413, {"error": f"Too many readings, max {BATCH_MAX_READINGS}"}, {}
+    rows, rejected = normalize_batch(readings, ip)
+    if rejected:
+        INGEST_READINGS.inc(len(rejected), result="invalid")
+    if rows:
+        try:
+            ingest_queue.put_many(rows)
+        except QueueFull as e:
+            INGEST_READINGS.inc(len(rows), result="queue_full")
+            return queue_full_response(e)
+        INGEST_READINGS.inc(len(rows), result="accepted")
+    return 200, {"status": "ok", "accepted": len(rows), "rejected": rejected}, {}
+
 @app.route('/api/log', methods=['POST'])
 def receive_data():
     try:
-        payload = request.get_json()
-        if not payload:
-            return jsonify({"error": "Invalid JSON"}), 400
-        ip = request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0].strip()
-        device_id = payload.get("device", ip)
-        save_to_db(device_id, ip, payload)
-        return jsonify({"status": "ok"}), 200
-    except Exception as e:
-        print(f"❌ API error: {e}")
+        status, body, headers = ingest_reading(request.get_json(silent=True), get_client_ip())
+        return jsonify(body), status, headers
+    except Exception:
+        log.exception("❌ API error")
         return jsonify({"error": "Internal error"}), 500
 
-def get_devices():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT device_id, MAX(timestamp) as last_seen,
-               co2, temp, status, source_ip
-        FROM logs
-        GROUP BY device_id
-        ORDER BY device_id
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
-
-def get_device_history(device_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM logs
-        WHERE device_id = ?
-        ORDER BY timestamp DESC
-        LIMIT 100
-    ''', (device_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+@app.route('/api/log/batch', methods=['POST'])
+def receive_batch():
+    try:
+        status, body, headers = ingest_batch(request.get_json(silent=True), get_client_ip())
+        return jsonify(body), status, headers
+    except Exception:
+        log.exception("❌ API error")
+        return jsonify({"error": "Internal error"}), 500
+
+@metrics.timed(DB_QUERY_SECONDS, func="get_devices")
+def get_devices(after=None, limit=DEVICES_PAGE_DEFAULT, status=None, co2_above=None, seen_since=None):
+    """Страница списка устройств по device_id после after (см. Storage.devices_page)."""
+    readings = [Reading(*row) for row in reader.devices_page(after, limit, status, co2_above, seen_since)]
+    return [{
+        'device_id': r.device_id, 'last_seen': r.ts, 'co2': r.co2,
+        'temp': r.temp, 'status': r.status, 'source_ip': r.source_ip,
+    } for r in readings]
+
+@metrics.timed(DB_QUERY_SECONDS, func="get_device_history")
+def get_device_history(device_id, limit=RECENT_PER_DEVICE):
+    """Последние limit показаний устройства от новых к старым.
+
+    Из памяти (recent_store); если там не хватает глубины — из БД, с дозаполнением буфера.
+    """
+    readings = recent_store.history(device_id, limit)
+    if readings is not None:
+        return [r.as_dict() for r in readings]
+    history = [Reading(*row).as_dict() for row in store.history(device_id, limit)]
+    if history:
+        recent_store.backfill(device_id, history)
+    return history
 
+@metrics.timed(DB_QUERY_SECONDS, func="get_statistics")
 def get_statistics():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(DISTINCT device_id) FROM logs')
-    total_devices = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT COUNT(DISTINCT device_id)
-        FROM logs
-        WHERE timestamp >= datetime('now', '-10 minutes')
-    ''')
-    active_devices = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT COUNT(DISTINCT device_id)
-        FROM logs
-        WHERE co2 > 0.09 AND timestamp >= datetime('now', '-10 minutes')
-    ''')
-    high_co2_alerts = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT AVG(temp)
-        FROM logs
-        WHERE temp IS NOT NULL AND timestamp >= datetime('now', '-10 minutes')
-    ''')
-    avg_temp = cursor.fetchone()[0]
-    conn.close()
-    return {
-        'total_devices': total_devices,
-        'active_devices': active_devices,
-        'high_co2_alerts': high_co2_alerts,
-        'avg_temp': round(avg_temp, 1) if avg_temp else 0
-    }
+    return window_stats.snapshot()
 
+@metrics.timed(DB_QUERY_SECONDS, func="get_trend_data")
 def get_trend_data():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT 
-            strftime('%H:00', timestamp) as hour,
-            AVG(co2) as avg_co2,
-            AVG(temp) as avg_temp
-        FROM logs
-        WHERE timestamp >= datetime('now', '-24 hours')
-        GROUP BY hour
-        ORDER BY hour
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    return [{'hour': row[0], 'co2': row[1], 'temp': row[2]} for row in rows]
+    since = int(time.time() * 1000) - 24 * 60 * 60 * 1000
+    return [{'hour': hour, 'co2': co2, 'temp': temp} for hour, co2, temp in reader.trend(since)]
+
+# === Статика ===
+_static_versions = {}
+
+def static_url(filename):
+    """URL статического файла с версией по содержимому — такой файл можно кэшировать навсегда."""
+    version = _static_versions.get(filename)
+    if version is None:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            version = _static_versions[filename] = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    return f"/static/{filename}?v={version}"
+
+@app.after_request
+def cache_static(response):
+    if request.endpoint == 'static' and 'v' in request.args and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+# === JSON API для страниц ===
+def _int_arg(name, default=None):
+    value = request.args.get(name)
+    return default if value in (None, "") else int(value)
+
+def _float_arg(name, default=None):
+    value = request.args.get(name)
+    return default if value in (None, "") else float(value)
+
+@app.route('/api/devices')
+@page_cache.cached(mimetype='application/json')
+def api_devices():
+    try:
+        limit = _int_arg("limit", DEVICES_PAGE_DEFAULT)
+        co2_above = _float_arg("co2_above")
+        seen_within = _int_arg("seen_within")   # секунды
+    except ValueError:
+        return jsonify({"error": "limit, co2_above and seen_within must be numbers"}), 400
+    if not 1 <= limit <= DEVICES_PAGE_MAX:
+        return jsonify({"error": f"limit must be between 1 and {DEVICES_PAGE_MAX}"}), 400
+    seen_since = int(time.time() * 1000) - seen_within * 1000 if seen_within is not None else None
+    devices = get_devices(request.args.get("after") or None, limit,
+                          request.args.get("status") or None, co2_above, seen_since)
+    # Курсор следующей страницы — последний device_id; null, если страниц больше нет
+    after = devices[-1]['device_id'] if len(devices) == limit else None
+    return json.dumps({'devices': devices, 'next': after})
+
+@app.route('/api/stats')
+@page_cache.cached(mimetype='application/json')
+def api_stats():
+    return json.dumps(get_statistics())
+
+@app.route('/api/trend')
+@page_cache.cached(mimetype='application/json')
+def api_trend():
+    return json.dumps(get_trend_data())
+
+@metrics.timed(DB_QUERY_SECONDS, func="get_device_latest")
+def get_device_latest(device_id):
+    reading = recent_store.latest(device_id)
+    if reading is not None:
+        return reading.as_dict()
+    row = reader.latest(device_id)
+    return Reading(*row).as_dict() if row else None
+
+@app.route('/api/device/<device_id>/latest')
+def api_device_latest(device_id):
+    latest = get_device_latest(device_id)
+    if latest is None:
+        return jsonify({"error": "Device not found"}), 404
+    return jsonify(latest)
+
+@app.route('/api/device/<device_id>/history')
+def api_device_history(device_id):
+    try:
+        limit = _int_arg("limit", RECENT_PER_DEVICE)
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    # Глубже RECENT_PER_DEVICE буфер не хранит — такие запросы шли бы в БД каждый раз
+    if not 1 <= limit <= RECENT_PER_DEVICE:
+        return jsonify({"error": f"limit must be between 1 and {RECENT_PER_DEVICE}"}), 400
+    history = get_device_history(device_id, limit)
+    if not history:
+        return jsonify({"error": "Device not found"}), 404
+    return jsonify({'device_id': device_id, 'readings': history})
+
+# === Ряды для графиков ===
+SERIES_FIELDS = ("co2", "temp")
+
+def series_source(from_ts, to_ts, points, now_ms=None):
+    """Самый подробный источник, где на точку графика приходится хотя бы пара строк.
+
+    Год 10-секундных показаний на 500 точек читается из rollup_1h (8760
+    строк), сутки — из сырых партиций. Периоды, уже удалённые очисткой,
+    берутся из следующего по грубости источника.
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    step = (to_ts - from_ts) / points
+    source = "raw"
+    for table in ("rollup_1m", "rollup_1h"):
+        if step >= 2 * rollups.ROLLUPS[table]:
+            source = table
+    if source == "raw" and retention.RAW_RETENTION_DAYS > 0 \
+            and from_ts < now_ms - retention.RAW_RETENTION_DAYS * retention.DAY_MS:
+        source = "rollup_1m"
+    if source == "rollup_1m" and retention.ROLLUP_1M_RETENTION_DAYS > 0 \
+            and from_ts < now_ms - retention.ROLLUP_1M_RETENTION_DAYS * retention.DAY_MS:
+        source = "rollup_1h"
+    return source
+
+def get_device_series(device_id, from_ts, to_ts, points, field="co2", mode="lttb"):
+    """Генератор точек [ts, value] для [from_ts, to_ts), прореженных до points."""
+    source = series_source(from_ts, to_ts, points)
+    if source == "raw":
+        rows = store.raw_points(device_id, field, from_ts, to_ts)
+    else:
+        rows = reader.rollup_points(source, device_id, field, from_ts, to_ts, mode)
+    return source, downsample.downsample(rows, from_ts, to_ts, points, mode)
+
+def _series_json(head, points):
+    started = time.perf_counter()
+    try:
+        yield json.dumps(head)[:-1] + ', "points": ['
+        chunk, sep = [], ""
+        for ts, value in points:
+            chunk.append(f"[{ts}, {json.dumps(value)}]")
+            if len(chunk) >= 500:
+                yield sep + ", ".join(chunk)
+                chunk, sep = [], ", "
+        yield (sep if chunk else "") + ", ".join(chunk) + "]}"
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, func="get_device_series")
+
+@app.route('/api/device/<device_id>/series')
+def api_device_series(device_id):
+    try:
+        to_ts = _int_arg("to", int(time.time() * 1000))
+        from_ts = _int_arg("from", to_ts - 24 * 60 * 60 * 1000)
+        points = _int_arg("points", SERIES_DEFAULT_POINTS)
+    except ValueError:
+        return jsonify({"error": "from, to and points must be integers"}), 400
+    field = request.args.get("field", "co2")
+    mode = request.args.get("mode", "lttb")
+    if field not in SERIES_FIELDS or mode not in downsample.MODES:
+        return jsonify({"error": f"field must be one of {SERIES_FIELDS}, mode one of {downsample.MODES}"}), 400
+    if from_ts >= to_ts or not 3 <= points <= SERIES_MAX_POINTS:
+        return jsonify({"error": f"need from < to and 3 <= points <= {SERIES_MAX_POINTS}"}), 400
+    source, series = get_device_series(device_id, from_ts, to_ts, points, field, mode)
+    head = {"device_id": device_id, "from": from_ts, "to": to_ts, "field": field,
+            "mode": mode, "source": source}
+    return Response(_series_json(head, series), mimetype='application/json')
+
+# === Выгрузка сырых показаний ===
+def _export_stream(chunks):
+    started = time.perf_counter()
+    try:
+        yield from chunks
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, func="export")
+
+@app.route('/api/export')
+def api_export():
+    """Строки logs в CSV или Parquet (bulk.py) — потоком из курсора, память не растёт с диапазоном."""
+    try:
+        to_ts = _int_arg("to", int(time.time() * 1000))
+        from_ts = _int_arg("from", 0)
+    except ValueError:
+        return jsonify({"error": "from and to must be integers"}), 400
+    fmt = request.args.get("format", "csv")
+    if fmt not in bulk.FORMATS:
+        return jsonify({"error": f"format must be one of {bulk.FORMATS}"}), 400
+    if fmt == "parquet" and bulk.pyarrow is None:
+        return jsonify({"error": "parquet export needs pyarrow"}), 501
+    if from_ts >= to_ts:
+        return jsonify({"error": "need from < to"}), 400
+    device_id = request.args.get("device") or None
+    rows = store.export_rows(device_id, from_ts, to_ts)
+    filename = f"co2-{device_id or 'all'}-{from_ts}-{to_ts}.{fmt}"
+    return Response(_export_stream(bulk.export_chunks(rows, fmt)), mimetype=bulk.MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# === Метрики ===
+metrics.gauge_func("co2_ingest_queue_rows", "Rows waiting in the write-behind queue", lambda: len(ingest_queue))
+metrics.gauge_func("co2_ingest_queue_capacity_rows", "Write-behind queue capacity", lambda: INGEST_QUEUE_SIZE)
+if writer_client is not None:
+    # 0 — процесс-писатель недоступен (упал и ещё не перезапущен): отправка ждёт его,
+    # показания копятся в очереди воркера, а когда она заполнится, API отвечает 429
+    metrics.gauge_func("co2_writer_connected", "1 if this worker is connected to the writer process",
+                       lambda: int(writer_client.connected))
+metrics.gauge_func("co2_db_size_bytes", "Size of the database on disk", store.size_bytes)
+metrics.gauge_func("co2_read_snapshot_age_seconds", "Age of the dashboard read snapshot", snapshot.snapshot_age)
+metrics.gauge_func("co2_logs_rows", "Raw readings per partition (estimate on PostgreSQL)", store.rows_by_partition, ["partition"])
+metrics.gauge_func("co2_page_cache_hits_total", "Page cache hits", lambda: page_cache.hits, kind="counter")
+metrics.gauge_func("co2_page_cache_misses_total", "Page cache misses", lambda: page_cache.misses, kind="counter")
+metrics.gauge_func("co2_page_cache_entries", "Pages in the cache", lambda: len(page_cache))
+metrics.gauge_func("co2_recent_devices", "Devices held in memory", lambda: len(recent_store))
+metrics.gauge_func("co2_sse_subscribers", "Open SSE streams", lambda: len(pubsub))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# === Поток показаний (Server-Sent Events) ===
+sse_thread_slots = threading.BoundedSemaphore(SSE_MAX_THREAD_STREAMS)
+
+def sse_response(topic, event="reading"):
+    if not sse_thread_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many streams"}), 503, {"Retry-After": "30"}
+    sub = pubsub.subscribe(topic, max_pending=SSE_CLIENT_QUEUE)
+    if sub is None:
+        sse_thread_slots.release()
+        return jsonify({"error": "Too many subscribers"}), 503, {"Retry-After": "30"}
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            deadline = time.monotonic() + SSE_MAX_STREAM_S
+            while time.monotonic() < deadline:
+                messages = sub.wait(SSE_HEARTBEAT_S)
+                if not messages:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "".join(f"event: {event}\ndata: {m}\n\n" for m in messages)
+        finally:
+            pubsub.unsubscribe(sub)
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Сервер закрывает ответ, даже если генератор так и не начал выполняться
+    response.call_on_close(sse_thread_slots.release)
+    return response
+
+@app.route('/api/stream')
+def stream_all():
+    return sse_response(ALL)
+
+@app.route('/api/device/<device_id>/stream')
+def stream_device(device_id):
+    return sse_response(device_topic(device_id))
+
+# === Оповещения ===
+@app.route('/api/alerts')
+def api_alerts():
+    return jsonify({
+        "rules": [rule.as_dict() for rule in alert_engine.rules],
+        "active": reader.active_alerts(),
+        "recent": reader.recent_alerts(100),
+    })
+
+@app.route('/api/alerts/stream')
+def stream_alerts():
+    return sse_response(ALERTS, event="alert")
 
 # === Главная страница ===
 @app.route('/')
+@page_cache.cached()
 def index():
-    devices = get_devices()
-    stats = get_statistics()
-    
-    device_rows = ""
-    for d in devices:
-        try:
-            time_str = datetime.fromisoformat(d['last_seen'].replace("Z", "+00:00")).strftime("%d %b %Y, %H:%M:%S")
-        except:
-            time_str = d['last_seen']
-        
-        status_class = "status-good"
-        if d['status'] == "VENT":
-            status_class = "status-vent"
-        elif d['status'] == "WARNING":
-            status_class = "status-warning"
-        
-        co2_class = "co2-normal"
-        if d['co2'] is not None:
-            if d['co2'] > 0.09:
-                co2_class = "co2-high"
-            elif d['co2'] > 0.06:
-                co2_class = "co2-medium"
-        
-        device_rows += f'''
-        <tr onclick="window.location.href='/device/{d['device_id']}/dashboard'" style="cursor:pointer;">
-            <td class="device-id">{d['device_id']}</td>
-            <td class="timestamp">{time_str}</td>
-            <td class="co2-value {co2_class}">{d['co2'] if d['co2'] is not None else '—'}</td>
-            <td class="temp-value">{d['temp'] if d['temp'] is not None else '—'}</td>
-            <td><span class="{status_class}">{d['status'] or '—'}</span></td>
-            <td>{d['source_ip']}</td>
-        </tr>
-        '''
-
-    trend_data = get_trend_data()
-    co2_chart_bars = "".join([
-        f'''
-        <div class="bar co2-bar" style="height: {min(100, max(10, int((dp['co2'] or 0) * 800)))}%; min-height: 10px;">
-            <div class="bar-value">{dp['co2']:.2f}</div>
-            <div class="bar-label">{dp['hour']}</div>
-        </div>
-        ''' for dp in trend_data
-    ])
-    
-    temp_chart_bars = "".join([
-        f'''
-        <div class="bar temp-bar" style="height: {min(100, max(10, int(((dp['temp'] or 0) - 15) * 10)))}%; min-height: 10px;">
-            <div class="bar-value">{int(dp['temp'])}°C</div>
-            <div class="bar-label">{dp['hour']}</div>
-        </div>
-        ''' for dp in trend_data
-    ])
-
-    return f'''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>CO2 Monitoring Dashboard</title>
-    <style>
-        :root {{ --primary: #4CAF50; --primary-dark: #388E3C; --secondary: #2196F3; --danger: #F44336; --warning: #FF9800; --light: #f9f9f9; --dark: #333; --gray: #f5f5f5; --border: #ddd; }}
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f5f7fa; color: #333; line-height: 1.6; }}
-        .container {{ max-width: 1200px; margin: 0 auto; padding: 20px; }}
-        header {{ background: linear-gradient(135deg, var(--primary), var(--primary-dark)); color: white; padding: 20px 0; box-shadow: 0 2px 10px rgba(0,0,0,0.1); margin-bottom: 30px; }}
-        .header-content {{ display: flex; justify-content: space-between; align-items: center; padding: 0 20px; }}
-        .header-title {{ font-size: 2rem; font-weight: 600; }}
-        .stats-container {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin-bottom: 30px; }}
-        .stat-card {{ background: white; border-radius: 10px; padding: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05); transition: transform 0.2s, box-shadow 0.2s; }}
-        .stat-card:hover {{ transform: translateY(-5px); box-shadow: 0 6px 12px rgba(0,0,0,0.1); }}
-        .stat-title {{ font-size: 0.9rem; color: #666; margin-bottom: 10px; }}
-        .stat-value {{ font-size: 2rem; font-weight: 700; color: var(--primary); }}
-        .stat-value.danger {{ color: var(--danger); }}
-        .table-container {{ background: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.05); margin-bottom: 30px; }}
-        table {{ width: 100%; border-collapse: collapse; }}
-        th {{ background-color: var(--primary); color: white; text-align: left; padding: 15px; font-weight: 600; }}
-        td {{ padding: 12px 15px; border-bottom: 1px solid var(--border); }}
-        tr:hover {{ background-color: var(--gray); }}
-        .status-good {{ color: var(--primary-dark); font-weight: bold; }}
-        .status-vent {{ color: var(--danger); font-weight: bold; }}
-        .status-warning {{ color: var(--warning); font-weight: bold; }}
-        .device-id {{ font-weight: 600; color: var(--secondary); }}
-        .timestamp {{ font-size: 0.9em; color: #666; }}
-        .co2-value {{ font-weight: 600; }}
-        .co2-high {{ color: var(--danger); }}
-        .co2-medium {{ color: var(--warning); }}
-        .co2-normal {{ color: var(--primary-dark); }}
-        .temp-value {{ font-weight: 600; }}
-        .chart-container {{ background: white; border-radius: 10px; padding: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05); margin-bottom: 30px; }}
-        .chart-header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; }}
-        .chart-title {{ font-size: 1.2rem; font-weight: 600; }}
-        .chart {{ height: 300px; display: flex; align-items: flex-end; gap: 5px; padding: 20px 0; }}
-        .bar {{ flex: 1; border-radius: 4px 4px 0 0; position: relative; min-width: 20px; }}
-        .bar-label {{ position: absolute; bottom: -25px; left: 0; right: 0; text-align: center; font-size: 0.8rem; color: #666; }}
-        .bar-value {{ position: absolute; top: -25px; left: 0; right: 0; text-align: center; font-size: 0.8rem; font-weight: 600; }}
-        .co2-bar {{ background: var(--primary); }}
-        .temp-bar {{ background: var(--secondary); }}
-        @media (max-width: 768px) {{
-            .header-content {{ flex-direction: column; text-align: center; gap: 10px; }}
-            .stats-container {{ grid-template-columns: 1fr; }}
-            table {{ display: block; overflow-x: auto; }}
-        }}
-    </style>
-</head>
-<body>
-    <header>
-        <div class="header-content">
-            <h1 class="header-title">📊 CO2 Monitoring Dashboard</h1>
-            <div>Last updated: <span id="current-time"></span></div>
-        </div>
-    </header>
-    <div class="container">
-        <div class="stats-container">
-            <div class="stat-card"><div class="stat-title">Total Devices</div><div class="stat-value">{stats['total_devices']}</div></div>
-            <div class="stat-card"><div class="stat-title">Active Devices</div><div class="stat-value">{stats['active_devices']}</div></div>
-            <div class="stat-card"><div class="stat-title">High CO2 Alerts</div><div class="stat-value danger">{stats['high_co2_alerts']}</div></div>
-            <div class="stat-card"><div class="stat-title">Avg Temperature</div><div class="stat-value">{stats['avg_temp']}°C</div></div>
-        </div>
-        <div class="table-container">
-            <table><thead><tr><th>Device ID</th><th>Last Seen</th><th>CO2 (% vol)</th><th>Temp (°C)</th><th>Status</th><th>IP Address</th></tr></thead><tbody>{device_rows or '<tr><td colspan="6" style="text-align:center">No data available</td></tr>'}</tbody></table>
-        </div>
-        <div class="chart-container">
-            <div class="chart-header"><h2 class="chart-title">CO2 Levels Trend (Last 24 Hours)</h2></div>
-            <div class="chart">{co2_chart_bars or '<div style="text-align:center; width:100%;">No trend data available</div>'}</div>
-        </div>
-        <div class="chart-container">
-            <div class="chart-header"><h2 class="chart-title">Temperature Trend (Last 24 Hours)</h2></div>
-            <div class="chart">{temp_chart_bars or '<div style="text-align:center; width:100%;">No trend data available</div>'}</div>
-        </div>
-    </div>
-    <script>
-        function updateCurrentTime() {{
-            const now = new Date();
-            document.getElementById('current-time').textContent = now.toLocaleString('en-US', {{
-                year: 'numeric', month: 'short', day: 'numeric',
-                hour: '2-digit', minute: '2-digit', second: '2-digit'
-            }});
-        }}
-        updateCurrentTime();
-        setInterval(updateCurrentTime, 1000);
-        setInterval(() => location.reload(), 30000);
-    </script>
-</body>
-</html>
-'''
+    return render_template("index.html", static_url=static_url,
+                           co2_warn=alerts.CO2_WARN, co2_high=alerts.CO2_HIGH)
 
 # === Маршрут для дашборда устройства ===
 @app.route('/device/<device_id>/dashboard')
+@page_cache.cached()
 def device_dashboard(device_id):
-    return device_dashboard_page(device_id, get_device_history)
+    return device_dashboard_page(device_id, get_device_latest, static_url,
+                                 co2_levels=(alerts.CO2_WARN_PPM, alerts.CO2_HIGH_PPM))
 
 # === ИНИЦИАЛИЗАЦИЯ ===
+# Шаблоны (templates/) компилируются один раз здесь, а не на первом запросе;
+# вне debug Jinja их не перечитывает
+for template in ("index.html", "device.html", "device_not_found.html"):
+    app.jinja_env.get_template(template)
 init_db()
+warm_recent_store()
+warm_window_stats()
+warm_alert_engine()
+retention_scheduler = RetentionScheduler(store)
+retention_scheduler.start()
+snapshot_refresher = snapshot.SnapshotRefresher()
+snapshot_refresher.start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=WEB_PORT, debug=False)
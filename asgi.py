@@ -0,0 +1,173 @@
+"""ASGI-вход для больших парков устройств.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --no-access-log
+
+Приём показаний (/api/log, /api/log/batch) и SSE-потоки обрабатываются прямо
+в цикле событий: разбор JSON и постановка в очередь отложенной записи не
+блокируют, а в SQLite пишет отдельный поток очереди (ingest.py). Поэтому один
+процесс держит десятки тысяч keep-alive соединений устройств и подписчиков.
+Остальные маршруты (/, /device/<id>/dashboard, /api/* для страниц) — то же
+Flask-приложение через WsgiToAsgi, в пуле потоков. С BINARY_INGEST_PORT в том
+же цикле событий слушает двоичный приём по UDP/TCP (binary_ingest.py).
+"""
+import asyncio
+import json
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as web
+import binary_ingest
+from pubsub import ALL, ALERTS, device_topic
+from log import get_logger
+
+log = get_logger("asgi")
+
+MAX_BODY_BYTES = 1024 * 1024
+BINARY_INGEST_PORT = int(os.getenv("BINARY_INGEST_PORT", 0))  # 0 — двоичный приём выключен
+
+flask_app = WsgiToAsgi(web.app)
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope):
+    forwarded = _header(scope, b"x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+async def read_body(receive):
+    """Тело запроса или None, если оно больше MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, status, body, headers=None):
+    data = json.dumps(body).encode()
+    raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+    raw_headers += [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": data})
+
+
+async def handle_ingest(scope, receive, send, handler):
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, 413, {"error": "Request body too large"})
+        return
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = None
+    try:
+        status, response, headers = handler(payload, client_ip(scope))
+    except Exception:
+        log.exception("❌ API error")
+        status, response, headers = 500, {"error": "Internal error"}, {}
+    await send_json(send, status, response, headers)
+
+
+async def handle_stream(scope, receive, send, topic, event="reading"):
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    # Писатель публикует из своего потока — будим цикл событий потокобезопасно
+    sub = web.pubsub.subscribe(topic, max_pending=web.SSE_CLIENT_QUEUE,
+                               notify=lambda: loop.call_soon_threadsafe(wakeup.set))
+    if sub is None:
+        await send_json(send, 503, {"error": "Too many subscribers"}, {"Retry-After": "30"})
+        return
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+        wakeup.set()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        deadline = time.monotonic() + web.SSE_MAX_STREAM_S
+        while not disconnected.is_set() and time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(wakeup.wait(), web.SSE_HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            messages = sub.drain()
+            if disconnected.is_set():
+                break
+            chunk = "".join(f"event: {event}\ndata: {m}\n\n" for m in messages) or ": keep-alive\n\n"
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        web.pubsub.unsubscribe(sub)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if BINARY_INGEST_PORT:
+                await binary_ingest.start_servers("0.0.0.0", BINARY_INGEST_PORT,
+                                                  web.ingest_reading, web.ingest_batch)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Дописываем очередь, не блокируя цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, web.close_ingest_queue)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] == "http":
+        method, path = scope["method"], scope["path"]
+        if method == "POST" and path == "/api/log":
+            await handle_ingest(scope, receive, send, web.ingest_reading)
+            return
+        if method == "POST" and path == "/api/log/batch":
+            await handle_ingest(scope, receive, send, web.ingest_batch)
+            return
+        if method == "GET" and path == "/api/stream":
+            await handle_stream(scope, receive, send, ALL)
+            return
+        if method == "GET" and path == "/api/alerts/stream":
+            await handle_stream(scope, receive, send, ALERTS, event="alert")
+            return
+        if method == "GET" and path.startswith("/api/device/") and path.endswith("/stream"):
+            device_id = path[len("/api/device/"):-len("/stream")]
+            if device_id and "/" not in device_id:
+                await handle_stream(scope, receive, send, device_topic(device_id))
+                return
+    await flask_app(scope, receive, send)
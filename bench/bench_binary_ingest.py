@@ -0,0 +1,70 @@
+"""Стоимость приёма одного показания: JSON через HTTP (Flask) против двоичного кадра.
+
+Меряет время обработки на стороне сервера без сети: для HTTP — полный
+проход через Flask (разбор запроса, get_json, X-Forwarded-For, JSON-ответ),
+для двоичного протокола — binary_ingest.handle_frame. Показания попадают в
+настоящую очередь записи во временной базе.
+
+    python bench/bench_binary_ingest.py --readings 20000 --batch 50
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+
+
+def readings(count):
+    return [{"device": f"bench-{i % 1000:04d}", "co2": 0.03 + (i % 90) / 1000,
+             "temp": 18 + i % 10, "status": "OK"} for i in range(count)]
+
+
+def timed(name, frames, readings_per_frame, func):
+    started = time.perf_counter()
+    for frame in frames:
+        func(frame)
+    elapsed = time.perf_counter() - started
+    per_frame = elapsed / len(frames) * 1e6
+    print(f"{name:>22}: {per_frame:8.1f} µs/frame, "
+          f"{per_frame / readings_per_frame:7.2f} µs/reading")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=50, help="readings per batched frame")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.environ.setdefault("INGEST_QUEUE_SIZE", str(args.readings * 10))
+    import app as web
+    import binary_ingest
+
+    data = readings(args.readings)
+    batches = [data[i:i + args.batch] for i in range(0, len(data), args.batch)]
+    client = web.app.test_client()
+
+    def ingest(frame):
+        binary_ingest.handle_frame(frame, "127.0.0.1", web.ingest_reading, web.ingest_batch)
+
+    timed("http json", [json.dumps(r) for r in data], 1, lambda body: client.post(
+        "/api/log", data=body, content_type="application/json"))
+    timed(f"http json batch x{args.batch}", [json.dumps(b) for b in batches], args.batch,
+          lambda body: client.post("/api/log/batch", data=body, content_type="application/json"))
+    timed("struct", [binary_ingest.encode_frame([r]) for r in data], 1, ingest)
+    timed(f"struct batch x{args.batch}", [binary_ingest.encode_frame(b) for b in batches], args.batch, ingest)
+    if binary_ingest.msgpack is not None:
+        pack = binary_ingest.msgpack.packb
+        timed("msgpack", [pack(r) for r in data], 1, ingest)
+        timed(f"msgpack batch x{args.batch}", [pack(b) for b in batches], args.batch, ingest)
+    else:
+        print("msgpack is not installed, skipping MessagePack frames")
+    web.ingest_queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
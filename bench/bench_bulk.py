@@ -0,0 +1,74 @@
+"""Скорость выгрузки (/api/export) и загрузки (manage.py import) сырых показаний.
+
+Синтетический парк (bench/fleet.py) создаётся во временной папке, выгружается
+в CSV и Parquet через Storage.export_rows и bulk.py, затем каждый файл
+загружается в пустую базу через Storage.import_batches. Для каждого шага —
+время, строк/с и размер файла.
+
+    python bench/bench_bulk.py
+    python bench/bench_bulk.py --devices 2000 --rows 10000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, ".."))
+sys.path.insert(0, BENCH)
+import fleet  # noqa: E402
+
+
+def counted(rows, counter):
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    source = os.path.join(tmp.name, "source")
+    os.makedirs(source)
+    print(f"Generating fleet: {args.devices:,} devices, {args.rows:,} rows")
+    fleet.generate(args.devices, 10, rows=args.rows, db_path=os.path.join(source, "co2_devices.db"), quiet=True)
+    os.environ.update(LOG_LEVEL="WARNING")
+    import bulk
+    import db
+    import storage
+
+    formats = [fmt for fmt in bulk.FORMATS if fmt != "parquet" or bulk.pyarrow is not None]
+    print(f"\n{'step':<20}{'seconds':>10}{'rows/s':>12}{'MB':>10}")
+    for fmt in formats:
+        path = os.path.join(tmp.name, f"export.{fmt}")
+        db.DB_PATH = os.path.join(source, "co2_devices.db")
+        exported = [0]
+        rows = counted(storage.SQLiteStorage().export_rows(None, 0, 2 ** 62), exported)
+        started = time.perf_counter()
+        with open(path, "wb") as f:
+            for chunk in bulk.export_chunks(rows, fmt):
+                f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{'export ' + fmt:<20}{elapsed:>10.1f}{exported[0] / elapsed:>12,.0f}{size:>10.1f}")
+
+        target = os.path.join(tmp.name, f"import-{fmt}")
+        os.makedirs(target)
+        db.DB_PATH = os.path.join(target, "co2_devices.db")
+        store = storage.SQLiteStorage()
+        store.migrate()
+        started = time.perf_counter()
+        count = store.import_batches(bulk.read_file(path, fmt))
+        elapsed = time.perf_counter() - started
+        print(f"{'import ' + fmt:<20}{elapsed:>10.1f}{count / elapsed:>12,.0f}{'':>10}")
+        db.close_connection()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Сравнение: соединение на каждый запрос (как раньше) против пула db.py.
+
+Один поток пишет показания по одному (commit на каждое), несколько потоков
+параллельно читают список устройств, как страница "/". Выводит QPS записи
+и задержки p50/p99, а также QPS читателей.
+
+    python bench/bench_db_pool.py --readers 4 --seconds 10
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        source_ip TEXT NOT NULL,
+        co2 REAL,
+        temp INTEGER,
+        status TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_device ON logs(device_id);
+    CREATE INDEX IF NOT EXISTS idx_timestamp ON logs(timestamp);
+'''
+INSERT_SQL = '''
+    INSERT INTO logs (device_id, timestamp, source_ip, co2, temp, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+READ_SQL = '''
+    SELECT device_id, MAX(timestamp) as last_seen, co2, temp, status, source_ip
+    FROM logs GROUP BY device_id ORDER BY device_id
+'''
+
+
+def legacy_connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def seed(path, devices, rows_per_device):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    ts = datetime.utcnow().isoformat() + "Z"
+    conn.executemany(INSERT_SQL, (
+        (f"dev-{d:04d}", ts, "10.0.0.1", 0.05, 22, "OK")
+        for d in range(devices) for _ in range(rows_per_device)
+    ))
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(mode, path, readers, seconds):
+    stop = threading.Event()
+    write_latencies = []
+    read_counts = [0] * readers
+    errors = []
+
+    if mode == "legacy":
+        def with_conn(fn):
+            conn = legacy_connect(path)
+            try:
+                return fn(conn)
+            finally:
+                conn.close()
+    else:
+        local = threading.local()
+
+        def with_conn(fn):
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = db.connect(path)
+            return fn(conn)
+
+    def write(conn):
+        conn.execute(INSERT_SQL, ("dev-0000", datetime.utcnow().isoformat() + "Z", "10.0.0.1", 0.05, 22, "OK"))
+        conn.commit()
+
+    def writer():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with_conn(write)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            write_latencies.append(time.perf_counter() - started)
+
+    def reader(i):
+        while not stop.is_set():
+            try:
+                with_conn(lambda conn: conn.execute(READ_SQL).fetchall())
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            read_counts[i] += 1
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f"{mode:>7}: ingest {len(write_latencies) / seconds:8.1f} qps, "
+          f"p50 {percentile(write_latencies, 50) * 1000:7.2f} ms, "
+          f"p99 {percentile(write_latencies, 99) * 1000:7.2f} ms | "
+          f"reads {sum(read_counts) / seconds:8.1f} qps | errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--rows-per-device", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("legacy", "pool"):
+            path = os.path.join(tmp, f"{mode}.db")
+            seed(path, args.devices, args.rows_per_device)
+            run(mode, path, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
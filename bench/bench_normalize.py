@@ -0,0 +1,80 @@
+"""Нормализация пачки показаний: построчно (build_row) против столбцов NumPy.
+
+Проверяет, что оба пути дают одинаковые строки, и меряет время на пачке,
+а также вместе с executemany во временную таблицу logs.
+
+    python bench/bench_normalize.py --readings 10000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import normalize  # noqa: E402
+import partitions  # noqa: E402
+
+
+def payloads(count, bad_share):
+    rng = random.Random(42)
+    result = []
+    for i in range(count):
+        reading = {
+            "device": f"dev-{i % 2000:04d}",
+            "co2": round(rng.uniform(0.03, 0.15), 4),
+            "temp": rng.randint(15, 30),
+            "status": rng.choice(["OK", "WARNING", "VENT"]),
+        }
+        if rng.random() < 0.05:
+            reading["temp"] = rng.choice([str(reading["temp"]), None])
+        if rng.random() < bad_share:
+            reading[rng.choice(["co2", "temp"])] = 1e6
+        result.append(reading)
+    return result
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--bad-share", type=float, default=0.01, help="share of out-of-range readings")
+    args = parser.parse_args()
+    if normalize.np is None:
+        print("numpy is not installed: normalize_batch falls back to the per-row path")
+
+    data = payloads(args.readings, args.bad_share)
+    ts = normalize.now_ms()
+    per_row = normalize._normalize_rows(data, "127.0.0.1", ts)
+    columnar = normalize.normalize_batch(data, "127.0.0.1", ts)
+    assert per_row == columnar, "paths disagree"
+    print(f"{len(per_row[0])} rows accepted, {len(per_row[1])} rejected — both paths agree")
+
+    conn = sqlite3.connect(":memory:")
+    partitions.create_schema(conn.cursor())
+
+    def insert(rows):
+        with conn:
+            conn.executemany(partitions.INSERT_SQL, rows)
+            conn.execute("DELETE FROM logs")
+
+    for name, func in (("per-row", normalize._normalize_rows), ("columnar", normalize.normalize_batch)):
+        normalize_s = best_of(args.repeat, lambda: func(data, "127.0.0.1", ts))
+        total_s = best_of(args.repeat, lambda: insert(func(data, "127.0.0.1", ts)[0]))
+        print(f"{name:>9}: normalize {normalize_s * 1000:7.2f} ms "
+              f"({normalize_s / args.readings * 1e6:5.2f} µs/reading), "
+              f"+ executemany {total_s * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
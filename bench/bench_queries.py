@@ -0,0 +1,115 @@
+"""Время функций-запросов app.py на базах разного размера (по умолчанию 1M, 10M и 100M строк).
+
+Для каждого размера в --workdir создаётся (один раз, потом переиспользуется)
+синтетический парк (bench/fleet.py), после чего в отдельном процессе с этой
+базой импортируется app и каждая функция вызывается --repeat раз. Замеры
+делаются дважды: "memory" — как в работе, с прогретыми показаниями в памяти,
+и "storage" — с пустым хранилищем в памяти, то есть только из SQLite.
+
+    python bench/bench_queries.py --workdir /var/tmp/co2-bench
+    python bench/bench_queries.py --sizes 1000000 --devices 500 --repeat 50
+
+База на 100M строк занимает ~15 ГБ и генерируется десятки минут.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = "1000000,10000000,100000000"
+
+
+def query_calls(app, device_id):
+    """(имя, вызов) для каждой функции-запроса app.py."""
+    return [
+        ("get_devices", lambda: app.get_devices()),
+        ("get_device_latest", lambda: app.get_device_latest(device_id)),
+        ("get_device_history", lambda: app.get_device_history(device_id)),
+        ("get_statistics", lambda: app.get_statistics()),
+        ("get_trend_data", lambda: app.get_trend_data()),
+        ("get_device_series/year", lambda: list(app.get_device_series(device_id, *_last_year(), 500)[1])),
+    ]
+
+
+def _last_year():
+    now_ms = int(time.time() * 1000)
+    return now_ms - 365 * 24 * 60 * 60 * 1000, now_ms
+
+
+def measure(repeat, device_count):
+    """Выполняется в дочернем процессе с DB_PATH нужной базы; печатает JSON."""
+    import app
+    import fleet
+    from recent import RecentStore
+
+    devices = fleet.device_ids(device_count)
+    results = {}
+    for mode in ("memory", "storage"):
+        for i, (name, _) in enumerate(query_calls(app, devices[0])):
+            times = []
+            for n in range(repeat):
+                if mode == "storage":
+                    # get_device_history дозаполняет хранилище — каждый вызов с пустым
+                    app.recent_store = RecentStore(app.RECENT_PER_DEVICE, app.RECENT_MAX_DEVICES)
+                call = query_calls(app, devices[n % len(devices)])[i][1]
+                started = time.perf_counter()
+                call()
+                times.append(time.perf_counter() - started)
+            times.sort()
+            results[f"{name}/{mode}"] = {
+                "median_ms": statistics.median(times) * 1000,
+                "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+            }
+    app.ingest_queue.close()
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "co2-bench"))
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.repeat, args.devices)
+        return
+
+    repo = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    table = {}
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for size in sizes:
+        folder = os.path.join(args.workdir, f"rows-{size}-devices-{args.devices}")
+        db_path = os.path.join(folder, "co2_devices.db")
+        if not os.path.exists(db_path):
+            os.makedirs(folder, exist_ok=True)
+            import fleet
+            print(f"Generating {size:,} rows in {folder}")
+            fleet.generate(args.devices, args.interval, rows=size, db_path=db_path)
+        env = dict(os.environ, DB_PATH=db_path, LOG_LEVEL="WARNING",
+                   PYTHONPATH=os.pathsep.join([repo, os.path.dirname(os.path.abspath(__file__))]))
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure",
+             "--repeat", str(args.repeat), "--devices", str(args.devices)],
+            cwd=folder, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        table[size] = json.loads(out.strip().splitlines()[-1])
+
+    names = list(next(iter(table.values())))
+    print(f"\n{'function / mode':<30}" + "".join(f"{f'{size:,} rows':>24}" for size in sizes))
+    print(f"{'':<30}" + "".join(f"{'median / p95 ms':>24}" for _ in sizes))
+    for name in names:
+        cells = "".join(f"{table[s][name]['median_ms']:>13.3f} /{table[s][name]['p95_ms']:>9.3f}" for s in sizes)
+        print(f"{name:<30}{cells}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Время отрисовки страниц на парке из 10k устройств: шаблоны, страницы списка устройств, кэш.
+
+Синтетический парк (bench/fleet.py) создаётся во временной папке, затем
+в этом же процессе импортируется app и каждый вариант выполняется --repeat
+раз. "miss" — ответ после очистки кэша страниц (отрисовка и сжатие),
+"hit" — готовый ответ из кэша.
+
+    python bench/bench_render.py
+    python bench/bench_render.py --devices 50000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, ".."))
+sys.path.insert(0, BENCH)
+import fleet  # noqa: E402
+
+
+def timings(repeat, func, before=None):
+    times = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return statistics.median(times), times[min(len(times) - 1, int(len(times) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "co2_devices.db")
+    print(f"Generating fleet: {args.devices:,} devices")
+    fleet.generate(args.devices, 10, rows=args.devices * 3, db_path=db_path, quiet=True)
+    os.environ.update(DB_PATH=db_path, LOG_LEVEL="WARNING")
+    os.chdir(tmp.name)
+    import app
+    from flask import render_template
+
+    client = app.app.test_client()
+    device_id = fleet.device_ids(args.devices)[0]
+    dashboard = f"/device/{device_id}/dashboard"
+    headers = {"Accept-Encoding": "gzip"}
+
+    def template(name, **context):
+        def render():
+            with app.app.test_request_context():
+                render_template(name, static_url=app.static_url, **context)
+        return render
+
+    def get(path):
+        def request():
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+        return request
+
+    cases = [
+        ("template index.html", template("index.html", co2_warn=0.08, co2_high=0.12), None),
+        ("template device.html", template("device.html", device_id=device_id, co2_levels=(800, 1200)), None),
+        ("/api/devices first page (json)", lambda: json.dumps(app.get_devices()), None),
+    ]
+    middle = fleet.device_ids(args.devices)[args.devices // 2]
+    for path in ("/", "/api/devices", f"/api/devices?after={middle}&limit=200",
+                 "/api/devices?status=VENT&co2_above=0.1", dashboard):
+        cases.append((f"GET {path} miss", get(path), app.page_cache.clear))
+        cases.append((f"GET {path} hit", get(path), None))
+
+    body = client.get("/api/devices").get_data()
+    print(f"{args.devices:,} devices, /api/devices page {len(body) / 1024:.0f} KB uncompressed\n")
+    print(f"{'case':<56}{'median ms':>12}{'p95 ms':>12}")
+    for name, func, before in cases:
+        median, p95 = timings(args.repeat, func, before)
+        print(f"{name:<56}{median * 1000:>12.3f}{p95 * 1000:>12.3f}")
+    app.ingest_queue.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
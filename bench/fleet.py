@@ -0,0 +1,107 @@
+"""Синтетический парк устройств: история показаний в базе для бенчмарков.
+
+Каждое устройство шлёт показание раз в --interval секунд; история
+заканчивается "сейчас" и уходит в прошлое на столько, сколько нужно для
+--rows строк (или на --days дней). CO2 и температура — суточная синусоида
+с шумом, у части устройств уровень CO2 выше порога. Генерация
+воспроизводима (--seed). Строки пишутся в помесячные партиции, затем
+заполняются device_latest и rollup-таблицы — как после обычной работы.
+
+    python bench/fleet.py --devices 1000 --interval 10 --rows 1000000
+    python bench/fleet.py --db /tmp/big.db --devices 5000 --days 30
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+import migrations  # noqa: E402
+import partitions  # noqa: E402
+import rollups  # noqa: E402
+
+CHUNK_ROWS = 200000
+DAY_S = 24 * 3600
+
+
+def device_ids(count):
+    return [f"sensor-{i:06d}" for i in range(count)]
+
+
+def generate(devices=1000, interval_s=10, rows=None, days=None, seed=1, db_path=None, quiet=False):
+    """Пишет историю в базу db_path (по умолчанию DB_PATH). Возвращает число строк."""
+    if db_path:
+        db.DB_PATH = db_path
+    if rows is None:
+        rows = int((days or 1) * DAY_S / interval_s) * devices
+    steps = max(1, rows // devices)
+    rng = random.Random(seed)
+    ids = device_ids(devices)
+    # Свой уровень CO2 и IP у каждого устройства; ~10% — в плохо проветриваемых комнатах
+    base_co2 = [rng.uniform(0.04, 0.07) if rng.random() > 0.1 else rng.uniform(0.09, 0.12) for _ in ids]
+    base_temp = [rng.uniform(19, 25) for _ in ids]
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(devices)]
+
+    conn = db.connect()
+    migrations.migrate(conn)
+    end_ms = int(time.time() * 1000)
+    start_ms = end_ms - (steps - 1) * interval_s * 1000
+    started = time.perf_counter()
+    written = 0
+    chunk = []
+    latest = {}
+    for step in range(steps):
+        ts = start_ms + step * interval_s * 1000
+        phase = math.sin(2 * math.pi * (ts / 1000 % DAY_S) / DAY_S)
+        for i, device_id in enumerate(ids):
+            co2 = round(base_co2[i] * (1 + 0.25 * phase) + rng.gauss(0, 0.003), 4)
+            temp = int(base_temp[i] + 2 * phase + rng.gauss(0, 0.5))
+            status = "VENT" if co2 > 0.09 else "WARNING" if co2 > 0.06 else "OK"
+            chunk.append((device_id, ts, ips[i], co2, temp, status))
+        if len(chunk) >= CHUNK_ROWS or step == steps - 1:
+            partitions.insert_rows(chunk)
+            for row in chunk[-devices:]:
+                latest[row[0]] = row
+            written += len(chunk)
+            chunk = []
+            if not quiet:
+                rate = written / (time.perf_counter() - started)
+                print(f"\r  {written:,} / {steps * devices:,} rows ({rate:,.0f} rows/s)", end="", flush=True)
+    if not quiet:
+        print()
+
+    with conn:
+        conn.executemany('''
+            INSERT INTO device_latest (device_id, last_seen, source_ip, co2, temp, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_id) DO UPDATE SET
+                last_seen = excluded.last_seen, source_ip = excluded.source_ip,
+                co2 = excluded.co2, temp = excluded.temp, status = excluded.status
+        ''', list(latest.values()))
+    rollups.backfill(conn)
+    conn.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database path (default: DB_PATH or co2_devices.db)")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=10, help="seconds between readings of one device")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, help="total rows of history")
+    size.add_argument("--days", type=float, help="days of history (default 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    written = generate(args.devices, args.interval, args.rows, args.days, args.seed, args.db)
+    print(f"✅ {written:,} rows for {args.devices} devices in {db.DB_PATH} "
+          f"({time.perf_counter() - started:.1f} s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Смешанная нагрузка на приём и страницы: пропускная способность и p50/p95/p99 по маршрутам.
+
+Каждый клиент — keep-alive соединение, которое выбирает маршрут по весам
+(--mix) и сразу шлёт следующий запрос. Устройства для POST /api/log и
+страниц устройств берутся из синтетического парка (bench/fleet.py).
+
+    # Поднять сервер на базе из 1M строк и погонять смесь по умолчанию:
+    python bench/loadgen.py --spawn flask --fleet-rows 1000000 --clients 100 --seconds 20
+    # Уже запущенный сервер, только чтение:
+    python bench/loadgen.py --url http://127.0.0.1:5000 --mix index=1,devices=1,stats=1
+    # p99 приёма под нагрузкой дашборда без кэша страниц — с основной базой и со снимком:
+    python bench/loadgen.py --spawn flask --mix log=5,series=5,alerts=1 --clients 50
+    READ_SNAPSHOT_S=5 python bench/loadgen.py --spawn flask --mix log=5,series=5,alerts=1 --clients 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fleet  # noqa: E402
+from loadtest_ingest import REPO, SERVERS, free_port, percentile, wait_for_port  # noqa: E402
+
+ROUTES = {
+    "log": ("POST", lambda d: "/api/log"),
+    "index": ("GET", lambda d: "/"),
+    "devices": ("GET", lambda d: "/api/devices"),
+    "stats": ("GET", lambda d: "/api/stats"),
+    "trend": ("GET", lambda d: "/api/trend"),
+    "latest": ("GET", lambda d: f"/api/device/{d}/latest"),
+    "dashboard": ("GET", lambda d: f"/device/{d}/dashboard"),
+    "series": ("GET", lambda d: f"/api/device/{d}/series?from=0&points=500"),
+    "alerts": ("GET", lambda d: "/api/alerts"),
+}
+DEFAULT_MIX = "log=10,index=1,devices=1,stats=1,trend=1,latest=2,dashboard=1"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ROUTES:
+            raise SystemExit(f"unknown route {name!r}, expected one of {', '.join(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def request(reader, writer, host, method, path, body=b""):
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if body:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    keep_alive = True
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "transfer-encoding" and value.strip().lower() == "chunked":
+            chunked = True
+        elif name.lower() == "connection" and value.strip().lower() == "close":
+            keep_alive = False
+    if chunked:
+        # Потоковые ответы (/series) приходят кусками: "размер\r\nданные\r\n" до куска 0
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(host, port, devices, names, weights, deadline, latencies, statuses):
+    rng = random.Random()
+    reader = writer = None
+    while time.monotonic() < deadline:
+        route = rng.choices(names, weights)[0]
+        method, path = ROUTES[route]
+        device_id = rng.choice(devices)
+        body = b""
+        if method == "POST":
+            body = json.dumps({"device": device_id, "co2": round(rng.uniform(0.03, 0.12), 4),
+                               "temp": rng.randint(18, 28), "status": "OK"}).encode()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            status, keep_alive = await request(reader, writer, host, method, path(device_id), body)
+            latencies[route].append(time.perf_counter() - started)
+            statuses[route][status] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+            statuses[route]["error"] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.1)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, clients, seconds, mix, devices):
+    parts = urlsplit(url)
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    deadline = time.monotonic() + seconds
+    names, weights = list(mix), list(mix.values())
+    await asyncio.gather(*(
+        client(parts.hostname, parts.port or 80, devices, names, weights, deadline, latencies, statuses)
+        for _ in range(clients)
+    ))
+    return latencies, statuses
+
+
+def report(latencies, statuses, seconds):
+    print(f"{'route':>10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for route in sorted(statuses):
+        values = latencies[route]
+        print(f"{route:>10} {len(values) / seconds:9.1f} {percentile(values, 50) * 1000:8.2f} "
+              f"{percentile(values, 95) * 1000:8.2f} {percentile(values, 99) * 1000:8.2f}  "
+              f"{dict(statuses[route])}")
+    total = sum(len(v) for v in latencies.values())
+    print(f"{'total':>10} {total / seconds:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--spawn", choices=list(SERVERS), help="start a server on a fresh synthetic fleet")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+    parser.add_argument("--fleet-devices", type=int, default=1000)
+    parser.add_argument("--fleet-interval", type=int, default=10)
+    parser.add_argument("--fleet-rows", type=int, default=100000, help="history rows for --spawn")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    devices = fleet.device_ids(args.fleet_devices)
+    if args.url:
+        report(*asyncio.run(run_load(args.url, args.clients, args.seconds, mix, devices)), args.seconds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "co2_devices.db")
+        print(f"Generating fleet: {args.fleet_devices} devices, {args.fleet_rows:,} rows")
+        fleet.generate(args.fleet_devices, args.fleet_interval, rows=args.fleet_rows, db_path=db_path)
+        port = free_port()
+        command = [arg.format(port=port) for arg in SERVERS[args.spawn]]
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(REPO), DB_PATH=db_path)
+        server = subprocess.Popen(command, cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port(port, timeout=120)
+            result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.clients, args.seconds, mix, devices))
+            report(*result, args.seconds)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
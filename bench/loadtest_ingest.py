@@ -0,0 +1,159 @@
+"""Нагрузочный тест приёма показаний: Flask (gunicorn) против ASGI (uvicorn).
+
+Каждое соединение — отдельное "устройство" с keep-alive, которое шлёт
+POST /api/log. Выводит пропускную способность, p50/p99 и коды ответов.
+
+    # Поднять оба сервера во временном каталоге и сравнить:
+    python bench/loadtest_ingest.py --spawn both --connections 500 --seconds 10
+    # Или нагрузить уже запущенный сервер:
+    python bench/loadtest_ingest.py --url http://127.0.0.1:5000 --connections 2000
+
+Для тысяч соединений поднимите лимит файлов: ulimit -n 65535.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVERS = {
+    "flask": ["gunicorn", "app:app", "--bind", "127.0.0.1:{port}",
+              "--worker-class", "gthread", "--threads", "64", "--log-level", "warning"],
+    "asgi": ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}",
+             "--no-access-log", "--log-level", "warning"],
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def device(host, port, index, deadline, latencies, statuses):
+    device_id = f"load-{index:05d}"
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            body = json.dumps({
+                "device": device_id,
+                "co2": round(random.uniform(0.03, 0.12), 4),
+                "temp": random.randint(18, 28),
+                "status": "OK",
+            }).encode()
+            started = time.perf_counter()
+            writer.write(
+                f"POST /api/log HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            keep_alive = True
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "connection" and value.strip().lower() == "close":
+                    keep_alive = False
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+            statuses["error"] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.1)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, connections, seconds):
+    parts = urlsplit(url)
+    latencies = []
+    statuses = Counter()
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(
+        device(parts.hostname, parts.port or 80, i, deadline, latencies, statuses)
+        for i in range(connections)
+    ))
+    return latencies, statuses
+
+
+def report(name, latencies, statuses, seconds):
+    print(f"{name:>6}: {len(latencies) / seconds:9.1f} req/s, "
+          f"p50 {percentile(latencies, 50) * 1000:7.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:8.2f} ms, "
+          f"statuses {dict(statuses)}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def spawn_and_run(mode, connections, seconds):
+    port = free_port()
+    command = [arg.format(port=port) for arg in SERVERS[mode]]
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(REPO))
+    with tempfile.TemporaryDirectory() as tmp:
+        server = subprocess.Popen(command, cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            latencies, statuses = asyncio.run(run_load(f"http://127.0.0.1:{port}", connections, seconds))
+            report(mode, latencies, statuses, seconds)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--spawn", choices=["flask", "asgi", "both"], help="start the server(s) in a temp dir")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    if args.url:
+        latencies, statuses = asyncio.run(run_load(args.url, args.connections, args.seconds))
+        report("server", latencies, statuses, args.seconds)
+        return
+    for mode in (["flask", "asgi"] if args.spawn == "both" else [args.spawn]):
+        spawn_and_run(mode, args.connections, args.seconds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Компактный приём показаний по UDP и TCP — для слабых датчиков и больших парков.
+
+Кадр — либо фиксированная двоичная структура, либо MessagePack (если
+установлен пакет msgpack):
+
+    struct:   "CO" | версия (1 байт) | число записей (2 байта) | записи
+    запись:   device_id (16 байт, UTF-8, дополнен нулями) | co2 (float32, NaN = нет)
+              | temp (int16, -32768 = нет) | status (8 байт, ASCII, дополнен нулями)
+    msgpack:  то же, что тело JSON для /api/log или /api/log/batch
+
+Все числа — big-endian. В UDP один датаграмма — один кадр, ответа нет. В TCP
+кадры идут потоком с префиксом длины (4 байта), на каждый сервер отвечает
+3 байтами: код (0 — принято, 1 — неверный кадр, 2 — очередь полна, 3 — ошибка)
+и число принятых показаний. Показания проходят те же проверки и ту же очередь
+записи, что и HTTP (app.ingest_reading / app.ingest_batch).
+
+    BINARY_INGEST_PORT=5683 uvicorn asgi:app ...   # вместе с ASGI-приложением
+    python binary_ingest.py --port 5683            # отдельным процессом
+"""
+import argparse
+import asyncio
+import math
+import os
+import struct
+
+from log import get_logger
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необязателен, двоичная структура работает без него
+    msgpack = None
+
+log = get_logger("binary_ingest")
+
+MAGIC = b"CO"
+VERSION = 1
+HEADER = struct.Struct("!2sBH")
+RECORD = struct.Struct("!16sfh8s")
+TEMP_NONE = -32768
+LENGTH = struct.Struct("!I")
+ACK = struct.Struct("!BH")
+MAX_FRAME_BYTES = 1024 * 1024
+
+ACK_OK, ACK_INVALID, ACK_QUEUE_FULL, ACK_ERROR = range(4)
+
+
+def encode_frame(readings):
+    """Кадр-структура из списка словарей {"device", "co2", "temp", "status"} (для клиентов и тестов)."""
+    parts = [HEADER.pack(MAGIC, VERSION, len(readings))]
+    for r in readings:
+        co2 = r.get("co2")
+        temp = r.get("temp")
+        parts.append(RECORD.pack(
+            r["device"].encode()[:16],
+            math.nan if co2 is None else co2,
+            TEMP_NONE if temp is None else temp,
+            str(r.get("status", "")).encode("ascii", "replace")[:8],
+        ))
+    return b"".join(parts)
+
+
+def decode_frame(data):
+    """Показания кадра: словарь (одно) или список словарей. ValueError для битого кадра."""
+    if data[:2] == MAGIC:
+        if len(data) < HEADER.size:
+            raise ValueError("truncated header")
+        _, version, count = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"unsupported version {version}")
+        if len(data) != HEADER.size + count * RECORD.size:
+            raise ValueError("frame length does not match record count")
+        readings = []
+        for device, co2, temp, status in RECORD.iter_unpack(memoryview(data)[HEADER.size:]):
+            readings.append({
+                "device": device.rstrip(b"\0").decode("utf-8", "replace"),
+                "co2": None if co2 != co2 else round(co2, 6),  # float32 -> короткий float
+                "temp": None if temp == TEMP_NONE else temp,
+                "status": status.rstrip(b"\0").decode("ascii", "replace"),
+            })
+        return readings
+    if msgpack is None:
+        raise ValueError("unknown frame format (msgpack is not installed)")
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except Exception as e:
+        raise ValueError(f"bad msgpack frame: {e}") from e
+
+
+def handle_frame(data, ip, ingest_reading, ingest_batch):
+    """Разбирает кадр и ставит показания в очередь записи. Возвращает (код, принято)."""
+    try:
+        payload = decode_frame(data)
+    except ValueError:
+        return ACK_INVALID, 0
+    try:
+        if isinstance(payload, dict) and "readings" not in payload:
+            status, body, _ = ingest_reading(payload, ip)
+            accepted = 1 if status == 200 else 0
+        else:
+            status, body, _ = ingest_batch(payload, ip)
+            accepted = body.get("accepted", 0)
+    except Exception:
+        log.exception("❌ Binary ingest error")
+        return ACK_ERROR, 0
+    if status == 429:
+        return ACK_QUEUE_FULL, 0
+    if status != 200:
+        return ACK_INVALID, 0
+    return ACK_OK, accepted
+
+
+class UdpIngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, ingest_reading, ingest_batch):
+        self.ingest_reading = ingest_reading
+        self.ingest_batch = ingest_batch
+
+    def datagram_received(self, data, addr):
+        handle_frame(data, addr[0], self.ingest_reading, self.ingest_batch)
+
+
+def tcp_handler(ingest_reading, ingest_batch):
+    async def handle(reader, writer):
+        ip = (writer.get_extra_info("peername") or ("",))[0]
+        try:
+            while True:
+                size = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+                if size > MAX_FRAME_BYTES:
+                    writer.write(ACK.pack(ACK_INVALID, 0))
+                    break
+                data = await reader.readexactly(size)
+                writer.write(ACK.pack(*handle_frame(data, ip, ingest_reading, ingest_batch)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def start_servers(host, port, ingest_reading, ingest_batch):
+    """Поднимает UDP- и TCP-приёмник на одном порту в текущем цикле событий."""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: UdpIngestProtocol(ingest_reading, ingest_batch), local_addr=(host, port))
+    server = await asyncio.start_server(tcp_handler(ingest_reading, ingest_batch), host, port)
+    log.info("📡 Двоичный приём показаний", extra={"host": host, "port": port})
+    return transport, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary UDP/TCP ingest listener")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("BINARY_INGEST_PORT", 5683)))
+    args = parser.parse_args()
+
+    import app as web
+
+    async def run():
+        await start_servers(args.host, args.port, web.ingest_reading, web.ingest_batch)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        web.close_ingest_queue()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Выгрузка и загрузка сырых показаний пачками: CSV и Parquet.
+
+Колонки везде одни и те же — строка logs (device_id, ts, source_ip, co2,
+temp, status), ts — мс от эпохи UTC. Выгрузка (/api/export) превращает
+поток строк из курсора хранилища в куски ответа, загрузка
+(python manage.py import) сначала проверяет файл целиком (check_file),
+затем читает его пачками и отдаёт строки Storage.import_batches. В памяти
+в каждый момент только одна пачка.
+
+    CSV      — заголовок и строки, пустое поле co2 и temp — NULL (status
+               остаётся пустой строкой);
+    Parquet  — группа строк на пачку, нужен pyarrow (requirements.txt).
+"""
+import csv
+import io
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet необязателен, CSV работает без него
+    pyarrow = None
+
+COLUMNS = ("device_id", "ts", "source_ip", "co2", "temp", "status")
+REQUIRED = ("device_id", "ts", "source_ip")   # NOT NULL в logs
+FORMATS = ("csv", "parquet")
+MIMETYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+CHUNK_ROWS = 50000   # строк в куске ответа CSV и в группе строк Parquet
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ValueError("parquet needs pyarrow, which is not installed")
+
+
+def _schema():
+    return pyarrow.schema([
+        ("device_id", pyarrow.string()),
+        ("ts", pyarrow.int64()),
+        ("source_ip", pyarrow.string()),
+        ("co2", pyarrow.float64()),
+        ("temp", pyarrow.int64()),
+        ("status", pyarrow.string()),
+    ])
+
+
+# === Выгрузка ===
+def csv_chunks(rows, chunk_rows=CHUNK_ROWS):
+    """Текст CSV кусками по chunk_rows строк; первый кусок начинается с заголовка."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    for batch in _batches(rows, chunk_rows):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # пустая выгрузка — только заголовок
+
+
+def parquet_chunks(rows, chunk_rows=CHUNK_ROWS):
+    """Файл Parquet кусками: группа строк на каждые chunk_rows строк, в конце — footer."""
+    _require_pyarrow()
+    schema = _schema()
+    sink = io.BytesIO()
+    with pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in _batches(rows, chunk_rows):
+            columns = list(zip(*batch))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def export_chunks(rows, fmt):
+    if fmt == "parquet":
+        return parquet_chunks(rows)
+    return csv_chunks(rows)
+
+
+# === Загрузка ===
+def _optional(convert, value):
+    return convert(value) if value != "" else None
+
+
+def read_csv(path, batch_rows=CHUNK_ROWS):
+    """Пачки строк logs из CSV с заголовком (порядок колонок — любой).
+
+    Строка с пустым device_id или source_ip или с неразборчивым числом —
+    ValueError с номером строки файла.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        missing = set(COLUMNS) - set(header)
+        if missing:
+            raise ValueError(f"missing columns {sorted(missing)}")
+        index = [header.index(name) for name in COLUMNS]
+        batch = []
+        for record in reader:
+            try:
+                device_id, ts, source_ip, co2, temp, status = (record[i] for i in index)
+                if not device_id or not source_ip:
+                    raise ValueError("device_id and source_ip must not be empty")
+                batch.append((device_id, int(ts), source_ip, _optional(float, co2),
+                              _optional(int, temp), status))
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"line {reader.line_num}: {e}") from None
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def read_parquet(path, batch_rows=CHUNK_ROWS):
+    """Пачки строк logs из Parquet, по batch_rows строк.
+
+    null в device_id, ts или source_ip — ValueError с номером строки.
+    """
+    _require_pyarrow()
+    offset = 0
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=list(COLUMNS)):
+        for name in REQUIRED:
+            column = batch.column(name)
+            if column.null_count:
+                row = offset + column.to_pylist().index(None) + 1
+                raise ValueError(f"row {row}: {name} is null")
+        yield list(zip(*(batch.column(name).to_pylist() for name in COLUMNS)))
+        offset += batch.num_rows
+
+
+def _skip(batches, count):
+    for batch in batches:
+        if count >= len(batch):
+            count -= len(batch)
+            continue
+        yield batch[count:]
+        count = 0
+
+
+def read_file(path, fmt=None, batch_rows=CHUNK_ROWS, skip_rows=0):
+    """Пачки строк из path; формат — по расширению, если не задан.
+
+    skip_rows первых строк данных пропускаются (но проверяются) — продолжение
+    прерванной загрузки.
+    """
+    fmt = fmt or ("parquet" if path.endswith((".parquet", ".pq")) else "csv")
+    if fmt == "parquet":
+        batches = read_parquet(path, batch_rows)
+    else:
+        batches = read_csv(path, batch_rows)
+    return _skip(batches, skip_rows) if skip_rows else batches
+
+
+def check_file(path, fmt=None, skip_rows=0):
+    """Читает файл целиком, ничего не записывая: число строк к загрузке или ValueError."""
+    return sum(len(batch) for batch in read_file(path, fmt, skip_rows=skip_rows))
@@ -0,0 +1,131 @@
+"""Кэш отрисованных страниц.
+
+Страница отрисовывается один раз и отдаётся всем клиентам, пока она свежая:
+не старше ttl секунд и не инвалидирована записью новых показаний. Чтобы
+непрерывный поток показаний не сводил кэш на нет, после инвалидации запись
+остаётся в силе ещё min_age секунд — то есть страница перерисовывается не
+чаще одного раза за min_age, сколько бы экранов её ни открывали.
+
+Тело сразу сжимается (gzip и, если установлен пакет brotli, br); ответы
+поддерживают ETag/Last-Modified и условные запросы (304).
+"""
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость
+    brotli = None
+
+_LOCK_STRIPES = 64
+
+
+class CachedPage:
+    __slots__ = ("body", "gzip", "br", "etag", "created", "last_modified", "generation", "mimetype")
+
+    def __init__(self, body, generation, mimetype="text/html"):
+        self.mimetype = mimetype
+        self.body = body.encode("utf-8")
+        self.gzip = gzip.compress(self.body, compresslevel=6)
+        self.br = brotli.compress(self.body) if brotli is not None else None
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.created = time.monotonic()
+        self.last_modified = time.time()
+        self.generation = generation
+
+    def response(self):
+        encodings = request.accept_encodings
+        if self.br is not None and encodings["br"]:
+            data, encoding = self.br, "br"
+        elif encodings["gzip"]:
+            data, encoding = self.gzip, "gzip"
+        else:
+            data, encoding = self.body, None
+        resp = Response(data, mimetype=self.mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Vary"] = "Accept-Encoding"
+        # У каждого сжатого варианта свой ETag
+        resp.set_etag(f"{self.etag}-{encoding}" if encoding else self.etag)
+        resp.last_modified = self.last_modified
+        resp.cache_control.no_cache = True
+        return resp.make_conditional(request)
+
+
+class ResponseCache:
+    def __init__(self, ttl=30, min_age=2, max_entries=1000, on_render=None):
+        self.ttl = ttl
+        self.min_age = min_age
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        # on_render(endpoint, секунды) — время отрисовки и сжатия при промахе
+        self.on_render = on_render
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    def invalidate(self):
+        """Помечает все страницы устаревшими (вызывается при записи показаний)."""
+        self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age = time.monotonic() - entry.created
+            if age >= self.ttl or (entry.generation != self.generation and age >= self.min_age):
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, mimetype="text/html"):
+        """Декоратор для Flask-представления, возвращающего тело ответа строкой."""
+        return functools.partial(self._wrap, mimetype=mimetype)
+
+    def _wrap(self, view, mimetype):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            entry = self._get(key)
+            if entry is None:
+                # Одну страницу отрисовывает один поток, остальные ждут его результат
+                with self._render_locks[hash(key) % _LOCK_STRIPES]:
+                    entry = self._get(key)
+                    if entry is None:
+                        generation = self.generation
+                        started = time.perf_counter()
+                        body = view(*args, **kwargs)
+                        if not isinstance(body, str):
+                            return body
+                        entry = CachedPage(body, generation, mimetype)
+                        if self.on_render is not None:
+                            self.on_render(request.endpoint, time.perf_counter() - started)
+                        self._put(key, entry)
+                        self.misses += 1
+                        return entry.response()
+            self.hits += 1
+            return entry.response()
+        return wrapper
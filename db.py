@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+
+# === Настройки БД ===
+DB_PATH = os.getenv("DB_PATH", "co2_devices.db")
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))  # байт
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 64 * 1024))   # кэш страниц на соединение
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+
+def connect(path=None):
+    """Открывает соединение с настроенными PRAGMA.
+
+    WAL позволяет читателям не ждать писателя, synchronous=NORMAL в WAL
+    делает fsync только при checkpoint, а не на каждый commit.
+    """
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection():
+    """Соединение текущего потока — открывается один раз и переиспользуется.
+
+    sqlite3 кэширует подготовленные выражения на соединение (cached_statements),
+    поэтому один и тот же SQL в потоке компилируется только при первом вызове.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = connect()
+        _local.conn = conn
+    return conn
+
+
+def close_connection():
+    """Закрывает соединение текущего потока (например, при остановке воркера)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
@@ -0,0 +1,126 @@
+"""Прореживание временного ряда до заданного числа точек — потоково.
+
+Точки (ts, value) приходят упорядоченными по ts прямо из курсора SQLite;
+диапазон [from_ts, to_ts) делится на равные по времени корзины (точки чуть
+раньше from_ts — начало интервала rollup — попадают в первую), и в памяти
+держатся только одна-две корзины, а не весь ряд. Если точек не больше
+threshold, они возвращаются как есть — прореживать нечего; для этого первые
+threshold + 1 точек буферизуются.
+
+    lttb    — Largest-Triangle-Three-Buckets: из каждой корзины одна точка,
+              образующая наибольший треугольник с выбранной точкой предыдущей
+              корзины и средним следующей. Форма графика сохраняется.
+    minmax  — из каждой корзины минимум и максимум (в порядке времени).
+              Пики никогда не теряются.
+"""
+
+from itertools import chain, islice
+
+MODES = ("lttb", "minmax")
+
+
+def _head(points, threshold):
+    """Первые threshold + 1 точек и итератор остальных."""
+    it = iter(points)
+    return list(islice(it, threshold + 1)), it
+
+
+def _average(bucket):
+    n = len(bucket)
+    return sum(p[0] for p in bucket) / n, sum(p[1] for p in bucket) / n
+
+
+def _largest_triangle(bucket, anchor, following):
+    ax, ay = anchor
+    cx, cy = following
+    best, best_area = bucket[0], -1.0
+    for point in bucket:
+        area = abs((ax - cx) * (point[1] - ay) - (ax - point[0]) * (cy - ay))
+        if area > best_area:
+            best, best_area = point, area
+    return best
+
+
+def _bucket_width(from_ts, to_ts, buckets):
+    return max(1.0, (to_ts - from_ts) / max(1, buckets))
+
+
+def _bucket_key(ts, from_ts, width, buckets):
+    # Точки до from_ts — в первую корзину; округление float не выводит за последнюю
+    return min(max(0, int((ts - from_ts) // width)), max(1, buckets) - 1)
+
+
+def lttb(points, from_ts, to_ts, threshold):
+    """Не больше threshold точек: первая, последняя и по одной из threshold - 2 корзин."""
+    head, rest = _head(points, threshold)
+    if len(head) <= threshold:
+        yield from head
+        return
+    it = chain(head, rest)
+    first = next(it)
+    yield first
+    width = _bucket_width(from_ts, to_ts, threshold - 2)
+    anchor = first
+    last = None
+    pending = None          # заполненная корзина, ждёт среднего следующей
+    current, current_key = [], None
+    for point in it:
+        if last is not None:
+            key = _bucket_key(last[0], from_ts, width, threshold - 2)
+            if key != current_key and current:
+                if pending is not None:
+                    anchor = _largest_triangle(pending, anchor, _average(current))
+                    yield anchor
+                pending, current = current, []
+            current_key = key
+            current.append(last)
+        last = point
+    if last is None:
+        return
+    if threshold > 2:
+        for bucket, following in ((pending, current), (current, None)):
+            if bucket:
+                anchor = _largest_triangle(bucket, anchor, _average(following) if following else last)
+                yield anchor
+    yield last
+
+
+def minmax(points, from_ts, to_ts, threshold):
+    """Не больше threshold точек: минимум и максимум каждой из threshold // 2 корзин."""
+    head, rest = _head(points, threshold)
+    if len(head) <= threshold:
+        yield from head
+        return
+    width = _bucket_width(from_ts, to_ts, threshold // 2)
+    low = high = None
+    current_key = None
+    for point in chain(head, rest):
+        key = _bucket_key(point[0], from_ts, width, threshold // 2)
+        if key != current_key:
+            if low is not None:
+                yield from _ordered(low, high)
+            low = high = point
+            current_key = key
+        elif point[1] < low[1]:
+            low = point
+        elif point[1] > high[1]:
+            high = point
+    if low is not None:
+        yield from _ordered(low, high)
+
+
+def _ordered(low, high):
+    if low is high:
+        yield low
+    elif low[0] <= high[0]:
+        yield low
+        yield high
+    else:
+        yield high
+        yield low
+
+
+def downsample(points, from_ts, to_ts, threshold, mode="lttb"):
+    if mode == "minmax":
+        return minmax(points, from_ts, to_ts, threshold)
+    return lttb(points, from_ts, to_ts, threshold)
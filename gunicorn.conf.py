@@ -0,0 +1,95 @@
+"""Настройки gunicorn: несколько воркеров и один процесс-писатель SQLite.
+
+    gunicorn app:app -c gunicorn.conf.py
+
+При WEB_CONCURRENCY > 1 мастер до запуска воркеров поднимает процесс-писатель
+(writer.py), и все воркеры отправляют ему пачки показаний вместо того,
+чтобы по очереди захватывать блокировку записи SQLite. Если писатель
+упадёт, мастер перезапускает его на том же сокете.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import writer
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 64))
+
+WRITER_RESTART_MAX_S = 30   # максимальная пауза между попытками перезапуска писателя
+
+_writer_process = None
+_watchdog = None
+_watchdog_stop = threading.Event()
+
+
+def _start_writer(path):
+    # Сокет от упавшего писателя остался бы и сошёл за готовность нового
+    if os.path.exists(path):
+        os.unlink(path)
+    # Отдельный интерпретатор, а не fork мастера: воркерам не достаются его дочерние процессы
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+        os.path.dirname(os.path.abspath(writer.__file__)), os.getenv("PYTHONPATH")])))
+    process = subprocess.Popen([sys.executable, "-m", "writer", path], env=env)
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            if process.poll() is None:
+                process.kill()
+            raise RuntimeError("ingest writer process failed to start")
+        time.sleep(0.1)
+    return process
+
+
+def _watch_writer(server, path):
+    """Перезапускает упавший процесс-писатель на том же сокете.
+
+    Воркеры сами переподключаются (writer.WriterClient); пачки, которые были
+    в очереди упавшего писателя, теряются.
+    """
+    global _writer_process
+    delay = 0.5
+    while not _watchdog_stop.wait(1):
+        # Код возврата не показываем: мастер gunicorn сам собирает дочерние процессы по SIGCHLD
+        if _writer_process.poll() is None:
+            continue
+        server.log.error("Ingest writer process (pid %s) exited, restarting", _writer_process.pid)
+        while not _watchdog_stop.is_set():
+            try:
+                _writer_process = _start_writer(path)
+            except Exception:
+                server.log.exception("Ingest writer restart failed, next attempt in %.1fs", delay)
+                _watchdog_stop.wait(delay)
+                delay = min(delay * 2, WRITER_RESTART_MAX_S)
+                continue
+            server.log.info("Ingest writer process restarted (pid %s)", _writer_process.pid)
+            delay = 0.5
+            break
+
+
+def on_starting(server):
+    global _writer_process, _watchdog
+    if server.cfg.workers < 2 or os.getenv(writer.WRITER_SOCKET_ENV):
+        return
+    path = os.path.join(tempfile.gettempdir(), f"co2-writer-{os.getpid()}.sock")
+    _writer_process = _start_writer(path)
+    # Воркеры наследуют окружение мастера
+    os.environ[writer.WRITER_SOCKET_ENV] = path
+    _watchdog = threading.Thread(target=_watch_writer, args=(server, path), name="writer-watchdog", daemon=True)
+    _watchdog.start()
+
+
+def on_exit(server):
+    # Воркеры уже остановлены и дописали свои очереди писателю
+    if _watchdog is not None:
+        _watchdog_stop.set()
+        _watchdog.join(60)
+    if _writer_process is not None and _writer_process.poll() is None:
+        _writer_process.terminate()
+        _writer_process.wait(30)
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+
+from log import get_logger
+
+log = get_logger("ingest")
+
+
+class QueueFull(Exception):
+    """Очередь записи переполнена — клиенту нужно повторить позже (HTTP 429)."""
+
+
+class WriteBehindQueue:
+    """Очередь отложенной записи.
+
+    Запросы кладут готовые строки в очередь и сразу отвечают клиенту,
+    а фоновый поток собирает их в пачки и передаёт в flush_func одной
+    транзакцией — каждые flush_interval секунд или по batch_rows строк.
+
+    С split_failed=True пачка, которую flush_func не смог записать, делится
+    пополам и пишется по частям: одна плохая строка не уносит с собой
+    остальные, клиентам которых уже ответили 200. Для flush_func, который
+    не пишет в БД сам (отправка писателю), делить нечего — пачка теряется.
+    """
+
+    def __init__(self, flush_func, max_size=10000, batch_rows=500, flush_interval=0.2, split_failed=False):
+        self.flush_func = flush_func
+        self.split_failed = split_failed
+        self.max_size = max_size
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._rows)
+
+    def put(self, row):
+        self.put_many([row])
+
+    def put_many(self, rows):
+        """Добавляет строки целиком или не добавляет ни одной (QueueFull)."""
+        with self._cond:
+            if self._closed:
+                raise QueueFull("queue is closed")
+            if len(self._rows) + len(rows) > self.max_size:
+                raise QueueFull(f"queue is full ({len(self._rows)}/{self.max_size})")
+            was_empty = not self._rows
+            self._rows.extend(rows)
+            self._ensure_started()
+            if was_empty or len(self._rows) >= self.batch_rows:
+                self._cond.notify()
+
+    def close(self, timeout=10):
+        """Останавливает поток записи, дописав всё, что осталось в очереди."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # Поток не запускался или не успел — дописываем сами
+        self._flush_all()
+
+    def _ensure_started(self):
+        # Поток стартует лениво: после fork (gunicorn) потоки родителя не живут
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            count = min(len(self._rows), self.batch_rows)
+            return [self._rows.popleft() for _ in range(count)]
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.flush_func(batch)
+            return
+        except Exception as e:
+            # retryable = False (storage.PartialWriteError) — часть пачки уже записана, повтор её задвоит
+            if not self.split_failed or len(batch) == 1 or not getattr(e, "retryable", True):
+                log.exception("❌ Ошибка записи пачки", extra={"rows": len(batch)})
+                return
+            log.warning("⚠️ Пачка не записана, пишем по частям", extra={"rows": len(batch)}, exc_info=True)
+        dropped = self._flush_split(batch)
+        if dropped:
+            log.error("❌ Часть пачки не записана", extra={"rows": len(batch), "dropped": dropped})
+
+    def _flush_split(self, batch):
+        """Пишет пачку половинами, делит дальше те, что не записались. Возвращает число потерянных строк."""
+        middle = len(batch) // 2
+        dropped = 0
+        for part in (batch[:middle], batch[middle:]):
+            try:
+                self.flush_func(part)
+            except Exception as e:
+                if len(part) > 1 and getattr(e, "retryable", True):
+                    dropped += self._flush_split(part)
+                else:
+                    log.warning("⚠️ Строка отброшена", extra={"row": repr(part[0])[:200], "error": str(e)})
+                    dropped += 1
+        return dropped
+
+    def _flush_all(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._rows:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._rows) < self.batch_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            if closed:
+                self._flush_all()
+                return
+            self._flush(self._take_batch())
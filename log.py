@@ -0,0 +1,207 @@
+"""Структурированный журнал, который не тормозит обработку запросов.
+
+Запись из потока запроса — только постановка в ограниченную очередь
+(QueueHandler); форматирование и вывод в stdout делает отдельный поток.
+Если очередь полна, сообщение отбрасывается и учитывается в счётчике.
+Повторяющиеся сообщения (одинаковый шаблон) ограничены LOG_RATE_LIMIT
+штуками за LOG_RATE_WINDOW_S; сколько пропущено, видно в поле suppressed
+следующего сообщения. Вместо строки на каждую пачку или показание
+счётчики (counters.add) раз в LOG_STATS_INTERVAL_S выводятся одной строкой.
+
+    from log import get_logger, counters
+    log = get_logger(__name__)
+    log.info("💾 Сохранено строк", extra={"rows": 500})
+    counters.add("rows_saved", 500)
+
+LOG_FORMAT=json — по строке JSON на сообщение, иначе "время уровень имя сообщение ключ=значение".
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 10))          # одинаковых сообщений за окно
+LOG_RATE_WINDOW_S = float(os.getenv("LOG_RATE_WINDOW_S", 60))
+LOG_STATS_INTERVAL_S = float(os.getenv("LOG_STATS_INTERVAL_S", 60))
+
+# Атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS}
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = (f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')} {record.levelname:<7} "
+                f"{record.name} {record.getMessage()}")
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше limit сообщений с одним шаблоном за window секунд."""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW_S):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._windows = {}  # (logger, шаблон) -> [начало окна, пропущено, подавлено]
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            counters.add("log_suppressed")
+            return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при полной очереди теряет сообщение, а не блокирует."""
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Поток вывода стартует лениво и заново после fork (gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            output = logging.StreamHandler()
+            output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+            self._listener = logging.handlers.QueueListener(self.queue, output)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counters.add("log_dropped")
+
+    def prepare(self, record):
+        # Форматирование — в потоке вывода, здесь только фиксируем текст и исключение
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+class Counters:
+    """Суммы событий, которые раз в interval секунд пишутся одной строкой."""
+
+    def __init__(self, interval=LOG_STATS_INTERVAL_S):
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, name, value=1):
+        with self._lock:
+            self._counts[name] += value
+        if self._thread is None or not self._thread.is_alive():
+            self._ensure_started()
+
+    def take(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.interval > 0 and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="log-counters", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        counts = self.take()
+        if counts:
+            get_logger("stats").info("📊 Счётчики", extra=dict(counts))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+counters = Counters()
+_handler = None
+
+
+def setup():
+    """Настраивает корневой журнал приложения (один раз на процесс)."""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = _DroppingQueueHandler(LOG_QUEUE_SIZE)
+    _handler.addFilter(RateLimitFilter())
+    root = logging.getLogger("co2")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    root.propagate = False
+    atexit.register(shutdown)
+
+
+def shutdown():
+    counters.flush()
+    if _handler is not None:
+        _handler.stop()
+
+
+def get_logger(name):
+    setup()
+    return logging.getLogger(f"co2.{name}")
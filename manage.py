@@ -0,0 +1,122 @@
+"""Служебные команды для базы.
+
+    python manage.py migrate            # обновить схему БД до текущей версии
+    python manage.py backfill-rollups   # пересобрать rollup-таблицы из logs (SQLite)
+    python manage.py retention          # один проход очистки старых данных
+    python manage.py import logs.csv    # загрузить показания из CSV или Parquet (bulk.py)
+
+С DATABASE_URL=postgresql://... команды работают с PostgreSQL (storage_pg.py).
+"""
+import argparse
+import sys
+import time
+
+import bulk
+import db
+import migrations
+import retention
+import rollups
+import storage
+
+
+def cmd_migrate(args):
+    store = storage.open_storage()
+    if store.name != "sqlite":
+        applied = store.migrate()
+        print(f"✅ Схема {store.name} " + ("создана" if applied else "актуальна"))
+        return
+    conn = db.connect()
+    before = migrations.current_version(conn)
+    applied = migrations.migrate(conn)
+    if applied:
+        conn.execute("VACUUM")  # вернуть место после переноса logs в партиции
+    conn.close()
+    if applied:
+        print(f"✅ Схема обновлена: {before} -> {applied[-1]}")
+    else:
+        print(f"✅ Схема актуальна (версия {before})")
+
+
+def cmd_backfill_rollups(args):
+    if storage.open_storage().name != "sqlite":
+        raise SystemExit("backfill-rollups поддерживается только для SQLite")
+    conn = db.connect()
+    migrations.migrate(conn)
+    counts = rollups.backfill(conn)
+    conn.close()
+    for table, count in counts.items():
+        print(f"✅ {table}: {count} строк")
+
+
+def cmd_retention(args):
+    if not retention.RetentionScheduler.enabled():
+        print("ℹ️ Очистка отключена: задайте RAW_RETENTION_DAYS и/или ROLLUP_1M_RETENTION_DAYS")
+        return
+    store = storage.open_storage()
+    store.migrate()
+    print(f"🧹 Очистка: {retention.apply_retention(store)}")
+
+
+def cmd_import(args):
+    # --skip-rows относится к первому файлу: так продолжается прерванная загрузка
+    skips = [args.skip_rows] + [0] * (len(args.paths) - 1)
+    if not args.no_check:
+        # Ошибка в любом файле — до первой записи, а не посреди загрузки
+        for path, skip in zip(args.paths, skips):
+            try:
+                bulk.check_file(path, args.format, skip)
+            except (OSError, ValueError) as e:
+                raise SystemExit(f"❌ {path}: {e}; ничего не загружено")
+    store = storage.open_storage()
+    store.migrate()
+    for i, (path, skip) in enumerate(zip(args.paths, skips)):
+        started = time.perf_counter()
+        imported = 0
+
+        def on_batch(rows):
+            nonlocal imported
+            imported += rows
+
+        try:
+            count = store.import_batches(bulk.read_file(path, args.format, args.batch_rows, skip), on_batch)
+        except BaseException as e:
+            # Пачки до ошибки записаны; повтор с --skip-rows продолжит со следующей строки
+            rest = " ".join(args.paths[i:])
+            print(f"⚠️ {path}: загружено {imported} строк; продолжить: "
+                  f"python manage.py import {rest} --skip-rows {skip + imported}", file=sys.stderr)
+            if isinstance(e, (OSError, ValueError)):
+                raise SystemExit(f"❌ {path}: {e}")
+            raise
+        elapsed = time.perf_counter() - started
+        print(f"✅ {path}: {count} строк за {elapsed:.1f} с ({count / max(elapsed, 1e-9):,.0f} строк/с)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CO2 monitor maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="upgrade the database schema")
+    migrate.set_defaults(func=cmd_migrate)
+
+    backfill = commands.add_parser("backfill-rollups", help="rebuild rollup tables from logs")
+    backfill.set_defaults(func=cmd_backfill_rollups)
+
+    purge = commands.add_parser("retention", help="delete data older than the retention policy")
+    purge.set_defaults(func=cmd_retention)
+
+    load = commands.add_parser("import", help="bulk-load readings from CSV or Parquet files")
+    load.add_argument("paths", nargs="+", help="files with columns " + ",".join(bulk.COLUMNS))
+    load.add_argument("--format", choices=bulk.FORMATS, help="default: by file extension")
+    load.add_argument("--batch-rows", type=int, default=bulk.CHUNK_ROWS, help="rows per transaction")
+    load.add_argument("--skip-rows", type=int, default=0,
+                      help="data rows of the first file to skip, to resume an interrupted import")
+    load.add_argument("--no-check", action="store_true",
+                      help="do not read the files through once before importing")
+    load.set_defaults(func=cmd_import)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
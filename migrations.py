@@ -0,0 +1,159 @@
+"""Схема БД и миграции.
+
+Версия схемы хранится в PRAGMA user_version. migrate() доводит любую базу
+до SCHEMA_VERSION: новую — создаёт, старую — переводит шаг за шагом.
+
+Версии:
+    0 — исходная схема: logs.timestamp TEXT в ISO-формате с 'Z'
+    1 — logs.ts INTEGER (мс от эпохи UTC), составной индекс (device_id, ts DESC),
+        device_latest.last_seen и rollup-интервалы тоже в мс
+    2 — logs вынесена из основной базы в помесячные файлы (partitions.py)
+"""
+import alerts
+import partitions
+import rollups
+
+SCHEMA_VERSION = 2
+
+
+def create_schema(cursor):
+    """Создаёт таблицы основной базы текущей версии (если их ещё нет)."""
+    # Последнее показание каждого устройства — обновляется при записи
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_latest (
+            device_id TEXT PRIMARY KEY,
+            last_seen INTEGER NOT NULL,
+            source_ip TEXT NOT NULL,
+            co2 REAL,
+            temp INTEGER,
+            status TEXT
+        )
+    ''')
+    # Фильтры постраничного списка устройств (/api/devices); страница — диапазон по device_id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_device_latest_status ON device_latest(status, device_id);')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_device_latest_seen ON device_latest(last_seen);')
+    rollups.create_tables(cursor)
+    alerts.create_table(cursor)
+
+
+def _fill_device_latest(cursor):
+    """Заполняет device_latest из logs, если таблица пуста."""
+    if cursor.execute('SELECT 1 FROM device_latest LIMIT 1').fetchone() is None:
+        cursor.execute('''
+            INSERT INTO device_latest (device_id, last_seen, source_ip, co2, temp, status)
+            SELECT device_id, ts, source_ip, co2, temp, status
+            FROM logs
+            WHERE id IN (SELECT MAX(id) FROM logs GROUP BY device_id)
+        ''')
+
+
+def _columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_to_epoch_ms(cursor):
+    """0 -> 1: ISO-строки в logs.timestamp -> целые миллисекунды в logs.ts."""
+    if "timestamp" not in _columns(cursor, "logs"):
+        return  # новая база, таблиц старого формата нет
+    cursor.execute('''
+        CREATE TABLE logs_v1 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            source_ip TEXT NOT NULL,
+            co2 REAL,
+            temp INTEGER,
+            status TEXT
+        )
+    ''')
+    # julianday понимает и 'T', и пробел, и суффикс 'Z'
+    cursor.execute('''
+        INSERT INTO logs_v1 (id, device_id, ts, source_ip, co2, temp, status)
+        SELECT id, device_id,
+               CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+               source_ip, co2, temp, status
+        FROM logs
+        WHERE julianday(timestamp) IS NOT NULL
+    ''')
+    cursor.execute('DROP TABLE logs')
+    cursor.execute('ALTER TABLE logs_v1 RENAME TO logs')
+    # Производные таблицы проще пересобрать из logs, чем конвертировать
+    cursor.execute('DROP TABLE IF EXISTS device_latest')
+    for table in rollups.ROLLUPS:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    partitions.create_schema(cursor)
+    create_schema(cursor)
+    _fill_device_latest(cursor)
+    rollups.rebuild(cursor)
+
+
+def _move_logs_to_partitions(cursor):
+    """1 -> 2: строки logs переносятся в помесячные файлы, таблица удаляется.
+
+    Копирование идёт через соединение партиции (ATTACH нельзя внутри
+    транзакции основной базы); INSERT OR IGNORE с исходными id делает
+    повторный запуск после сбоя безопасным.
+    """
+    if "ts" not in _columns(cursor, "logs"):
+        return
+    main_path = cursor.execute("PRAGMA database_list").fetchone()[2]
+    first, last = cursor.execute("SELECT MIN(ts), MAX(ts) FROM logs").fetchone()
+    key = partitions.partition_key(first) if first is not None else None
+    while key is not None:
+        start, end = partitions.partition_bounds(key)
+        part = partitions.connection(key, create=True)
+        part.execute("ATTACH DATABASE ? AS src", (main_path,))
+        try:
+            with part:
+                part.execute('''
+                    INSERT OR IGNORE INTO logs (id, device_id, ts, source_ip, co2, temp, status)
+                    SELECT id, device_id, ts, source_ip, co2, temp, status
+                    FROM src.logs
+                    WHERE ts >= ? AND ts < ?
+                ''', (start, end))
+        finally:
+            part.execute("DETACH DATABASE src")
+        key = partitions.partition_key(end) if end <= last else None
+    cursor.execute("DROP TABLE logs")
+
+
+# Шаги миграции: (версия после шага, функция)
+MIGRATIONS = [
+    (1, _migrate_to_epoch_ms),
+    (2, _move_logs_to_partitions),
+]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Применяет недостающие миграции и создаёт схему. Возвращает список применённых версий."""
+    applied = []
+    version = current_version(conn)
+    if version == 0 and conn.execute("SELECT 1 FROM sqlite_master WHERE type='table'").fetchone() is None:
+        # Пустая база — сразу создаём текущую схему
+        with conn:
+            create_schema(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        return applied
+    for target, step in MIGRATIONS:
+        if version >= target:
+            continue
+        with conn:
+            cursor = conn.cursor()
+            # Явный BEGIN: иначе sqlite3 выполнит DDL вне транзакции.
+            # IMMEDIATE — чтобы два воркера не мигрировали одновременно
+            cursor.execute('BEGIN IMMEDIATE')
+            if current_version(conn) >= target:
+                version = target
+                continue
+            step(cursor)
+            cursor.execute(f'PRAGMA user_version = {target}')
+        version = target
+        applied.append(target)
+    with conn:
+        cursor = conn.cursor()
+        create_schema(cursor)
+    return applied
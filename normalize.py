@@ -0,0 +1,118 @@
+"""Проверка и приведение показаний к строкам таблицы logs.
+
+build_row обрабатывает одно показание. normalize_batch делает то же для
+пачки по столбцам: co2 и temp разбираются одним вызовом NumPy, проверка
+диапазонов — векторная, а готовые кортежи сразу уходят в очередь записи и
+executemany. Если NumPy не установлен, пачка мала или в ней есть значения,
+которые NumPy не разобрал, используется построчный путь — результат тот же.
+"""
+import os
+import time
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен — без него работает построчный путь
+    np = None
+
+# Всё, что вне диапазона, — неисправный датчик или мусор, а не показание
+CO2_MIN = float(os.getenv("CO2_MIN", 0))        # % vol
+CO2_MAX = float(os.getenv("CO2_MAX", 10))
+TEMP_MIN = float(os.getenv("TEMP_MIN", -50))    # °C
+TEMP_MAX = float(os.getenv("TEMP_MAX", 100))
+STATUS_MAX_LEN = 20
+DEVICE_ID_MAX_LEN = 64
+VECTOR_MIN_ROWS = 64  # на меньших пачках накладные расходы NumPy не окупаются
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def _valid_device_id(device_id):
+    return type(device_id) is str and 0 < len(device_id) <= DEVICE_ID_MAX_LEN
+
+
+def build_row(device_id, ip, payload, ts=None):
+    """Проверяет показание и возвращает строку для таблицы logs."""
+    if not _valid_device_id(device_id):
+        raise ValueError("device must be a non-empty string of at most %d characters" % DEVICE_ID_MAX_LEN)
+    co2 = float(payload["co2"]) if "co2" in payload and payload["co2"] is not None else None
+    if co2 is not None and not CO2_MIN <= co2 <= CO2_MAX:
+        raise ValueError(f"co2 out of range: {co2}")
+    temp_raw = payload.get("temp")
+    temp = None
+    if temp_raw is not None:
+        try:
+            temp = float(temp_raw)
+        except OverflowError:
+            # Целое, которое не помещается в float, — заведомо вне диапазона
+            raise ValueError("temp out of range") from None
+        except (ValueError, TypeError):
+            temp = None
+    if temp is not None and temp == temp:
+        if not TEMP_MIN <= temp <= TEMP_MAX:
+            raise ValueError(f"temp out of range: {temp}")
+        temp = int(temp)
+    else:
+        temp = None
+    status = str(payload.get("status", ""))[:STATUS_MAX_LEN]
+    return (device_id, ts or now_ms(), ip, co2, temp, status)
+
+
+def _normalize_rows(readings, ip, ts):
+    rows = []
+    rejected = []
+    for i, reading in enumerate(readings):
+        try:
+            if not isinstance(reading, dict):
+                raise TypeError("reading must be an object")
+            rows.append(build_row(reading.get("device", ip), ip, reading, ts))
+        except (ValueError, TypeError, OverflowError) as e:
+            rejected.append({"index": i, "error": str(e)})
+    return rows, rejected
+
+
+def normalize_batch(readings, ip, ts=None):
+    """Строки для logs из списка показаний и список отклонённых {"index", "error"}."""
+    ts = ts or now_ms()
+    if np is None or len(readings) < VECTOR_MIN_ROWS:
+        return _normalize_rows(readings, ip, ts)
+    try:
+        co2_raw = [r.get("co2") for r in readings]
+        # None превращается в NaN, числа в строках разбираются здесь же
+        co2 = np.array(co2_raw, dtype=np.float64)
+        temp = np.array([r.get("temp") for r in readings], dtype=np.float64)
+    except (AttributeError, ValueError, TypeError, OverflowError):
+        # Не словарь или значение, которое NumPy не разобрал, — построчно, с точными ошибками
+        return _normalize_rows(readings, ip, ts)
+
+    co2_missing = np.isnan(co2)
+    # NaN, пришедший не из None (например, строка "nan"), — ошибка, как и в build_row
+    for i in np.flatnonzero(co2_missing):
+        if co2_raw[i] is not None:
+            return _normalize_rows(readings, ip, ts)
+    temp_missing = np.isnan(temp)
+    with np.errstate(invalid="ignore"):
+        co2_bad = ~co2_missing & ((co2 < CO2_MIN) | (co2 > CO2_MAX))
+        temp_bad = ~temp_missing & ((temp < TEMP_MIN) | (temp > TEMP_MAX))
+
+    co2_col = co2.astype(object)
+    co2_col[co2_missing] = None
+    temp_col = np.trunc(np.where(temp_missing | temp_bad, 0, temp)).astype(np.int64).astype(object)
+    temp_col[temp_missing] = None
+    devices = [r.get("device", ip) for r in readings]
+    if not all(map(_valid_device_id, devices)):
+        return _normalize_rows(readings, ip, ts)
+    statuses = [s if type(s) is str and len(s) <= STATUS_MAX_LEN else str(s)[:STATUS_MAX_LEN]
+                for s in [r.get("status", "") for r in readings]]
+    rows = list(zip(devices, repeat(ts), repeat(ip), co2_col, temp_col, statuses))
+
+    bad = co2_bad | temp_bad
+    if not bad.any():
+        return rows, []
+    rejected = [
+        {"index": int(i), "error": f"co2 out of range: {co2[i]}" if co2_bad[i] else f"temp out of range: {temp[i]}"}
+        for i in np.flatnonzero(bad)
+    ]
+    return [rows[i] for i in np.flatnonzero(~bad)], rejected
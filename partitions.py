@@ -0,0 +1,144 @@
+"""Помесячное хранение сырых показаний.
+
+Таблица logs разбита на отдельные файлы SQLite по месяцам (UTC):
+co2_devices.logs-202405.db, co2_devices.logs-202406.db, ...
+Основная база хранит только производные таблицы (device_latest, rollup_*),
+поэтому удаление старых данных — это удаление файла, а не DELETE + VACUUM.
+"""
+import calendar
+import glob
+import os
+import re
+import threading
+import time
+
+import db
+
+_local = threading.local()
+_KEY_RE = re.compile(r"\.logs-(\d{6})\.db$")
+
+INSERT_SQL = '''
+    INSERT INTO logs (device_id, ts, source_ip, co2, temp, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def create_schema(cursor, indexes=True):
+    """Таблица logs; indexes=False — без индексов (массовая загрузка строит их в конце)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            source_ip TEXT NOT NULL,
+            co2 REAL,
+            temp INTEGER,
+            status TEXT
+        )
+    ''')
+    if indexes:
+        create_indexes(cursor)
+
+
+def create_indexes(cursor):
+    # История и оконные запросы по устройству — диапазон по индексу,
+    # co2/temp в индексе избавляют от обращения к таблице для графиков
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_device_ts ON logs(device_id, ts DESC, co2, temp);')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts);')
+
+
+def partition_key(ts):
+    """Ключ месяца ('202405') для метки времени в мс."""
+    t = time.gmtime(ts / 1000)
+    return f"{t.tm_year:04d}{t.tm_mon:02d}"
+
+
+def partition_bounds(key):
+    """Границы месяца [start, end) в мс."""
+    year, month = int(key[:4]), int(key[4:])
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    start = calendar.timegm((year, month, 1, 0, 0, 0))
+    end = calendar.timegm((next_year, next_month, 1, 0, 0, 0))
+    return start * 1000, end * 1000
+
+
+def partition_path(key):
+    base, _ext = os.path.splitext(db.DB_PATH)
+    return f"{base}.logs-{key}.db"
+
+
+def list_partitions():
+    """Ключи существующих партиций, от старых к новым."""
+    base, _ext = os.path.splitext(db.DB_PATH)
+    keys = []
+    for path in glob.glob(f"{glob.escape(base)}.logs-*.db"):
+        match = _KEY_RE.search(path)
+        if match:
+            keys.append(match.group(1))
+    return sorted(keys)
+
+
+def partitions_for_range(from_ts=None, to_ts=None, newest_first=True):
+    """Ключи партиций, пересекающихся с [from_ts, to_ts)."""
+    keys = []
+    for key in list_partitions():
+        start, end = partition_bounds(key)
+        if (from_ts is None or end > from_ts) and (to_ts is None or start < to_ts):
+            keys.append(key)
+    return keys[::-1] if newest_first else keys
+
+
+def connection(key, create=False):
+    """Соединение текущего потока с партицией; None, если её нет и create=False."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    path = partition_path(key)
+    conn = conns.get(key)
+    # Партицию мог удалить процесс очистки — закрываем устаревшее соединение
+    if conn is not None and not os.path.exists(path):
+        conn.close()
+        del conns[key]
+        conn = None
+    if conn is None:
+        if not create and not os.path.exists(path):
+            return None
+        conn = db.connect(path)
+        if create:
+            create_schema(conn.cursor())
+            conn.commit()
+        conns[key] = conn
+    return conn
+
+
+def close_connections():
+    """Закрывает соединения текущего потока со всеми партициями."""
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+
+
+def insert_rows(rows):
+    """Записывает строки logs в партиции их месяцев (транзакция на партицию)."""
+    by_key = {}
+    for row in rows:
+        by_key.setdefault(partition_key(row[1]), []).append(row)
+    for key, part_rows in by_key.items():
+        conn = connection(key, create=True)
+        with conn:
+            conn.executemany(INSERT_SQL, part_rows)
+
+
+def drop(key):
+    """Удаляет партицию целиком вместе с файлами WAL."""
+    conns = getattr(_local, "conns", None) or {}
+    conn = conns.pop(key, None)
+    if conn is not None:
+        conn.close()
+    path = partition_path(key)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
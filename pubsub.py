@@ -0,0 +1,90 @@
+"""Рассылка новых показаний подписчикам (SSE) внутри процесса.
+
+У каждого подписчика своя ограниченная очередь, в которой сообщения
+схлопываются по ключу (device_id): медленный клиент получит только
+последнее показание устройства, а не все накопившиеся. Сообщение
+сериализуется один раз и разделяется между всеми подписчиками.
+"""
+import threading
+from collections import OrderedDict
+
+ALL = "*"
+ALERTS = "alerts"  # переходы оповещений (alerts.py)
+
+
+def device_topic(device_id):
+    return f"device:{device_id}"
+
+
+class Subscriber:
+    __slots__ = ("topic", "max_pending", "pending", "dropped", "notify", "_event", "_lock")
+
+    def __init__(self, topic, max_pending=1000, notify=None):
+        self.topic = topic
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.dropped = 0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # notify можно подменить, например на loop.call_soon_threadsafe для asyncio
+        self.notify = notify or self._event.set
+
+    def push(self, key, message):
+        with self._lock:
+            self.pending.pop(key, None)
+            self.pending[key] = message
+            if len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+        self.notify()
+
+    def drain(self):
+        with self._lock:
+            messages = list(self.pending.values())
+            self.pending.clear()
+            self._event.clear()
+        return messages
+
+    def wait(self, timeout):
+        """Ждёт сообщений до timeout секунд и забирает их (пустой список — таймаут)."""
+        self._event.wait(timeout)
+        return self.drain()
+
+
+class PubSub:
+    def __init__(self, max_subscribers=5000):
+        self.max_subscribers = max_subscribers
+        self._topics = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, topic, max_pending=1000, notify=None):
+        """Новый подписчик или None, если достигнут лимит подписчиков."""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            sub = Subscriber(topic, max_pending, notify)
+            self._topics.setdefault(topic, set()).add(sub)
+            self._count += 1
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._topics.get(sub.topic)
+            if subs and sub in subs:
+                subs.discard(sub)
+                self._count -= 1
+                if not subs:
+                    del self._topics[sub.topic]
+
+    def publish(self, topic, key, message):
+        subs = self._topics.get(topic)
+        if not subs:
+            return
+        with self._lock:
+            subs = list(subs)
+        for sub in subs:
+            sub.push(key, message)
@@ -0,0 +1,152 @@
+"""Последние показания устройств в памяти процесса.
+
+Для каждого устройства — кольцевой буфер фиксированного размера на массивах
+array (метки времени, co2, temp), без словаря на каждую запись. Буферы
+пополняются при записи пачки показаний; при превышении лимита устройств
+вытесняются самые давно не обновлявшиеся (LRU).
+"""
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+NAN = float("nan")
+
+
+class Reading:
+    """Одно показание; ключи as_dict() совпадают со строкой logs."""
+
+    __slots__ = ("device_id", "ts", "source_ip", "co2", "temp", "status")
+
+    def __init__(self, device_id, ts, source_ip, co2, temp, status):
+        self.device_id = device_id
+        self.ts = ts
+        self.source_ip = source_ip
+        self.co2 = co2
+        self.temp = temp
+        self.status = status
+
+    def as_dict(self):
+        return {
+            "device_id": self.device_id,
+            "ts": self.ts,
+            "source_ip": self.source_ip,
+            "co2": self.co2,
+            "temp": self.temp,
+            "status": self.status,
+        }
+
+
+class DeviceRing:
+    """Кольцевой буфер показаний одного устройства. None хранится как NaN."""
+
+    __slots__ = ("ts", "co2", "temp", "status", "source_ip", "head", "size", "backfilled")
+
+    def __init__(self, capacity):
+        self.ts = array("q", bytes(8 * capacity))
+        self.co2 = array("d", bytes(8 * capacity))
+        self.temp = array("d", bytes(8 * capacity))
+        self.status = [None] * capacity
+        self.source_ip = [None] * capacity
+        self.head = 0        # индекс следующей записи
+        self.size = 0
+        self.backfilled = False  # глубина истории уже догружена из БД
+
+    def append(self, ts, source_ip, co2, temp, status):
+        i = self.head
+        self.ts[i] = ts
+        self.co2[i] = NAN if co2 is None else co2
+        self.temp[i] = NAN if temp is None else temp
+        self.status[i] = status
+        self.source_ip[i] = source_ip
+        self.head = (i + 1) % len(self.ts)
+        if self.size < len(self.ts):
+            self.size += 1
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def newest(self, device_id, limit):
+        """Записи от новых к старым."""
+        capacity = len(self.ts)
+        result = []
+        for n in range(min(limit, self.size)):
+            i = (self.head - 1 - n) % capacity
+            co2 = self.co2[i]
+            temp = self.temp[i]
+            result.append(Reading(
+                device_id, self.ts[i], self.source_ip[i],
+                None if math.isnan(co2) else co2,
+                None if math.isnan(temp) else int(temp),
+                self.status[i],
+            ))
+        return result
+
+
+class RecentStore:
+    def __init__(self, per_device=100, max_devices=20000):
+        self.per_device = per_device
+        self.max_devices = max_devices
+        self._rings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rings)
+
+    def _ring(self, device_id):
+        ring = self._rings.get(device_id)
+        if ring is None:
+            ring = self._rings[device_id] = DeviceRing(self.per_device)
+            if len(self._rings) > self.max_devices:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(device_id)
+        return ring
+
+    def add_rows(self, rows):
+        """Добавляет строки logs (device_id, ts, source_ip, co2, temp, status)."""
+        with self._lock:
+            for device_id, ts, source_ip, co2, temp, status in rows:
+                self._ring(device_id).append(ts, source_ip, co2, temp, status)
+
+    def warm(self, latest_rows):
+        """Прогрев при старте: по одному последнему показанию на устройство."""
+        with self._lock:
+            for device_id, ts, source_ip, co2, temp, status in latest_rows:
+                ring = self._ring(device_id)
+                if ring.size == 0:
+                    ring.append(ts, source_ip, co2, temp, status)
+
+    def backfill(self, device_id, rows):
+        """Догружает историю из БД (rows — словари logs от новых к старым).
+
+        Показания, пришедшие после чтения из БД, сохраняются поверх загруженных.
+        """
+        with self._lock:
+            ring = self._ring(device_id)
+            newest_ts = rows[0]["ts"] if rows else None
+            newer = [r for r in reversed(ring.newest(device_id, ring.size))
+                     if newest_ts is None or r.ts > newest_ts]
+            ring.clear()
+            for row in reversed(rows[:self.per_device]):
+                ring.append(row["ts"], row["source_ip"], row["co2"], row["temp"], row["status"])
+            for r in newer:
+                ring.append(r.ts, r.source_ip, r.co2, r.temp, r.status)
+            ring.backfilled = True
+
+    def history(self, device_id, limit):
+        """Список Reading от новых к старым или None, если в памяти не хватает глубины."""
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is None or (ring.size < limit and not ring.backfilled):
+                return None
+            self._rings.move_to_end(device_id)
+            return ring.newest(device_id, limit)
+
+    def latest(self, device_id):
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is None or ring.size == 0:
+                return None
+            return ring.newest(device_id, 1)[0]
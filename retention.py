@@ -0,0 +1,130 @@
+"""Очистка старых данных.
+
+Сырые показания хранятся RAW_RETENTION_DAYS дней: партиции, целиком вышедшие
+за срок, удаляются как файлы, а в пограничной партиции старые строки удаляются
+небольшими пачками, чтобы не держать блокировку записи. За удалённые периоды
+остаются rollup-таблицы — они пополняются при записи каждой пачки. Минутные
+агрегаты хранятся ROLLUP_1M_RETENTION_DAYS дней, часовые — без ограничения.
+Значение 0 отключает соответствующую очистку.
+"""
+import fcntl
+import os
+import threading
+import time
+
+import db
+import partitions
+from log import get_logger
+
+log = get_logger("retention")
+
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", 0))
+ROLLUP_1M_RETENTION_DAYS = int(os.getenv("ROLLUP_1M_RETENTION_DAYS", 0))
+RETENTION_INTERVAL_S = int(os.getenv("RETENTION_INTERVAL_S", 3600))
+RETENTION_BATCH_ROWS = int(os.getenv("RETENTION_BATCH_ROWS", 5000))
+RETENTION_BATCH_PAUSE_S = 0.05  # пауза между пачками — окно для записи
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _delete_in_batches(conn, sql, params):
+    deleted = 0
+    while True:
+        with conn:
+            count = conn.execute(sql, (*params, RETENTION_BATCH_ROWS)).rowcount
+        deleted += count
+        if count < RETENTION_BATCH_ROWS:
+            return deleted
+        time.sleep(RETENTION_BATCH_PAUSE_S)
+
+
+def purge_raw(cutoff):
+    """Удаляет сырые показания старше cutoff (мс). Возвращает (партиций, строк)."""
+    dropped = deleted = 0
+    for key in partitions.list_partitions():
+        start, end = partitions.partition_bounds(key)
+        if end <= cutoff:
+            partitions.drop(key)
+            dropped += 1
+        elif start < cutoff:
+            conn = partitions.connection(key)
+            if conn is not None:
+                deleted += _delete_in_batches(conn, '''
+                    DELETE FROM logs WHERE id IN (
+                        SELECT id FROM logs WHERE ts < ? ORDER BY ts LIMIT ?
+                    )
+                ''', (cutoff,))
+    return dropped, deleted
+
+
+def purge_rollup_1m(cutoff):
+    """Удаляет минутные агрегаты старше cutoff — по часу интервалов за транзакцию."""
+    conn = db.get_connection()
+    deleted = 0
+    while True:
+        oldest = conn.execute('SELECT MIN(bucket) FROM rollup_1m').fetchone()[0]
+        if oldest is None or oldest >= cutoff:
+            return deleted
+        upto = min(cutoff, oldest + 60 * 60 * 1000)
+        with conn:
+            deleted += conn.execute('DELETE FROM rollup_1m WHERE bucket < ?', (upto,)).rowcount
+        time.sleep(RETENTION_BATCH_PAUSE_S)
+
+
+def apply_retention(store, now_ms=None):
+    """Один проход очистки хранилища (storage.py) по текущим настройкам. Возвращает сводку."""
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    summary = {}
+    if RAW_RETENTION_DAYS > 0:
+        dropped, deleted = store.purge_raw(now_ms - RAW_RETENTION_DAYS * DAY_MS)
+        summary["partitions_dropped"] = dropped
+        summary["raw_rows_deleted"] = deleted
+    if ROLLUP_1M_RETENTION_DAYS > 0:
+        summary["rollup_1m_rows_deleted"] = store.purge_rollup_1m(now_ms - ROLLUP_1M_RETENTION_DAYS * DAY_MS)
+    return summary
+
+
+class RetentionScheduler:
+    """Фоновый поток, запускающий очистку раз в interval секунд.
+
+    Файловая блокировка гарантирует, что из нескольких воркеров gunicorn
+    очистку в каждый момент выполняет только один. С PostgreSQL узлы могут
+    чистить одновременно — удаление пачками от этого не ломается.
+    """
+
+    def __init__(self, store, interval=RETENTION_INTERVAL_S):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def enabled():
+        return RAW_RETENTION_DAYS > 0 or ROLLUP_1M_RETENTION_DAYS > 0
+
+    def start(self):
+        if self._thread is None and self.enabled():
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        with open(f"{db.DB_PATH}.retention.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None  # очистку сейчас выполняет другой процесс
+            return apply_retention(self.store)
+
+    def _run(self):
+        while True:
+            try:
+                summary = self.run_once()
+                if summary:
+                    log.info("🧹 Очистка", extra=summary)
+            except Exception:
+                log.exception("❌ Ошибка очистки")
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,156 @@
+"""Предагрегированные показания по минутам и часам.
+
+Для каждого устройства и интервала хранятся count, sum, min, max по co2 и temp.
+Таблицы обновляются при записи пачки показаний, поэтому страницы читают
+десятки строк rollup вместо сканирования logs. Они же остаются единственной
+историей за периоды, сырые данные которых удалены очисткой (retention.py).
+"""
+import partitions
+
+# Имя таблицы -> длина интервала в мс (bucket — начало интервала, мс от эпохи)
+ROLLUPS = {
+    "rollup_1m": 60 * 1000,
+    "rollup_1h": 60 * 60 * 1000,
+}
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        bucket INTEGER NOT NULL,
+        device_id TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        co2_count INTEGER NOT NULL,
+        co2_sum REAL NOT NULL,
+        co2_min REAL,
+        co2_max REAL,
+        temp_count INTEGER NOT NULL,
+        temp_sum REAL NOT NULL,
+        temp_min INTEGER,
+        temp_max INTEGER,
+        PRIMARY KEY (bucket, device_id)
+    ) WITHOUT ROWID
+'''
+
+_ON_CONFLICT = '''
+    ON CONFLICT(bucket, device_id) DO UPDATE SET
+        count = count + excluded.count,
+        co2_count = co2_count + excluded.co2_count,
+        co2_sum = co2_sum + excluded.co2_sum,
+        co2_min = MIN(COALESCE(co2_min, excluded.co2_min), COALESCE(excluded.co2_min, co2_min)),
+        co2_max = MAX(COALESCE(co2_max, excluded.co2_max), COALESCE(excluded.co2_max, co2_max)),
+        temp_count = temp_count + excluded.temp_count,
+        temp_sum = temp_sum + excluded.temp_sum,
+        temp_min = MIN(COALESCE(temp_min, excluded.temp_min), COALESCE(excluded.temp_min, temp_min)),
+        temp_max = MAX(COALESCE(temp_max, excluded.temp_max), COALESCE(excluded.temp_max, temp_max))
+'''
+
+_UPSERT = '''
+    INSERT INTO {table} (bucket, device_id, count,
+                         co2_count, co2_sum, co2_min, co2_max,
+                         temp_count, temp_sum, temp_min, temp_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+''' + _ON_CONFLICT
+
+_BACKFILL = '''
+    INSERT INTO {table} (bucket, device_id, count,
+                         co2_count, co2_sum, co2_min, co2_max,
+                         temp_count, temp_sum, temp_min, temp_max)
+    SELECT ts / {size} * {size} AS bucket, device_id, COUNT(*),
+           COUNT(co2), TOTAL(co2), MIN(co2), MAX(co2),
+           COUNT(temp), TOTAL(temp), MIN(temp), MAX(temp)
+    FROM {source}
+    WHERE {where}
+    GROUP BY bucket, device_id
+'''
+
+# Пересчёт агрегатов временной таблицы rollup_merge в интервалы size;
+# WHERE 1 нужен SQLite, чтобы ON CONFLICT не читался как часть SELECT
+_COMBINE = '''
+    INSERT INTO {table} (bucket, device_id, count,
+                         co2_count, co2_sum, co2_min, co2_max,
+                         temp_count, temp_sum, temp_min, temp_max)
+    SELECT bucket / {size} * {size}, device_id, SUM(count),
+           SUM(co2_count), SUM(co2_sum), MIN(co2_min), MAX(co2_max),
+           SUM(temp_count), SUM(temp_sum), MIN(temp_min), MAX(temp_max)
+    FROM temp.rollup_merge
+    WHERE 1
+    GROUP BY 1, 2
+'''
+
+
+def create_tables(cursor):
+    for table in ROLLUPS:
+        cursor.execute(_SCHEMA.format(table=table))
+        # Ряд одного устройства за период (/api/device/<id>/series) — диапазон по индексу
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_device ON {table}(device_id, bucket);')
+
+
+def aggregate(rows, size):
+    """Сворачивает строки logs в агрегаты по (интервал, устройство)."""
+    groups = {}
+    for device_id, ts, _ip, co2, temp, _status in rows:
+        key = (ts - ts % size, device_id)
+        agg = groups.get(key)
+        if agg is None:
+            agg = groups[key] = [0, 0, 0.0, None, None, 0, 0.0, None, None]
+        agg[0] += 1
+        if co2 is not None:
+            agg[1] += 1
+            agg[2] += co2
+            agg[3] = co2 if agg[3] is None else min(agg[3], co2)
+            agg[4] = co2 if agg[4] is None else max(agg[4], co2)
+        if temp is not None:
+            agg[5] += 1
+            agg[6] += temp
+            agg[7] = temp if agg[7] is None else min(agg[7], temp)
+            agg[8] = temp if agg[8] is None else max(agg[8], temp)
+    return [(bucket, device_id, *agg) for (bucket, device_id), agg in groups.items()]
+
+
+def update_rollups(conn, rows):
+    """Добавляет пачку строк logs в rollup-таблицы (внутри транзакции вызывающего)."""
+    for table, size in ROLLUPS.items():
+        conn.executemany(_UPSERT.format(table=table), aggregate(rows, size))
+
+
+def merge(conn, source, where, params=()):
+    """Добавляет строки source, отобранные where, к уже посчитанным агрегатам (внутри транзакции вызывающего).
+
+    Агрегирует SQLite, а не Python: строки source просматриваются один раз
+    в самый мелкий интервал (временная таблица), более крупные собираются
+    из него. Так массовая загрузка (Storage.import_batches) обновляет
+    rollup-таблицы несколькими запросами на пачку партиции.
+    """
+    (finest, finest_size), *coarser = ROLLUPS.items()
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_merge")
+    conn.execute(f"CREATE TEMP TABLE rollup_merge AS SELECT * FROM main.{finest} WHERE 0")
+    conn.execute(_BACKFILL.format(table="temp.rollup_merge", size=finest_size, source=source, where=where), params)
+    for table, size in ((finest, finest_size), *coarser):
+        conn.execute(_COMBINE.format(table=table, size=size) + _ON_CONFLICT)
+    conn.execute("DROP TABLE temp.rollup_merge")
+
+
+def rebuild(cursor, source="logs"):
+    """Пересобирает rollup-таблицы из source целиком (внутри транзакции вызывающего)."""
+    for table, size in ROLLUPS.items():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(_BACKFILL.format(table=table, size=size, source=source, where="1"))
+
+
+def backfill(conn):
+    """Пересобирает rollup-таблицы из партиций logs, по транзакции на месяц.
+
+    Интервалы за месяцы, партиции которых уже удалены, не трогаются.
+    Границы месяцев совпадают с границами часов, поэтому интервал
+    никогда не делится между партициями.
+    """
+    for key in partitions.list_partitions():
+        start, end = partitions.partition_bounds(key)
+        conn.execute("ATTACH DATABASE ? AS part", (partitions.partition_path(key),))
+        try:
+            with conn:
+                for table, size in ROLLUPS.items():
+                    conn.execute(f"DELETE FROM {table} WHERE bucket >= ? AND bucket < ?", (start, end))
+                    conn.execute(_BACKFILL.format(table=table, size=size, source="part.logs", where="1"))
+        finally:
+            conn.execute("DETACH DATABASE part")
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ROLLUPS}
@@ -0,0 +1,217 @@
+"""Снимок основной базы для запросов дашборда.
+
+Страницы списка устройств, тренд, ряды из rollup-таблиц и оповещения читают
+device_latest, rollup_1m, rollup_1h и alerts — те же таблицы основной базы,
+куда каждую пачку пишет приём показаний. При READ_SNAPSHOT_S > 0 эти запросы
+идут в отдельный файл, который раз в READ_SNAPSHOT_S секунд собирается из
+основной базы:
+
+    co2_devices.db            ← запись (приём, очистка, прогрев при старте)
+    co2_devices.snapshot.db   ← чтение дашборда (SnapshotStorage)
+
+В снимок копируется не вся база, а только то, что читает дашборд, поэтому
+цена копирования не растёт с историей: device_latest целиком, rollup_1h за
+последние 25 часов (тренд за сутки), rollup_1m за READ_SNAPSHOT_ROLLUP_1M_S
+и из alerts — последний переход каждой пары (устройство, правило) и
+RECENT_ALERTS последних переходов. Более старые ряды и длинные списки
+оповещений SnapshotStorage читает из основной базы.
+
+Снимок пишется во временный файл и подменяется через os.replace, поэтому
+читатель всегда видит целый файл. Копию снимает один процесс на хост
+(файловая блокировка, как у очистки), остальные воркеры только открывают
+новый файл. Снимок не меняется, поэтому читается с immutable=1 — без
+блокировок и без обращений к WAL основной базы; число зрителей дашборда
+больше не влияет на запись. Цена — данные страниц отстают от приёма не
+больше чем на READ_SNAPSHOT_S (живые строки таблицы по-прежнему приходят
+через /api/stream). Если снимок старше READ_SNAPSHOT_MAX_AGE_S (например,
+копирование сломалось), чтение возвращается к основной базе.
+
+Сырые партиции logs в снимок не входят: история и ряды из сырых строк
+читаются из партиций, последняя сотня строк устройства — из памяти
+(recent.py). Для PostgreSQL снимок не нужен — там читатели не блокируют
+запись, а нагрузку чтения выносят на реплику.
+"""
+import fcntl
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+import db
+import rollups
+from log import get_logger
+from storage import SQLiteStorage
+
+log = get_logger("snapshot")
+
+READ_SNAPSHOT_S = float(os.getenv("READ_SNAPSHOT_S", 0))  # 0 — дашборд читает основную базу
+READ_SNAPSHOT_MAX_AGE_S = float(os.getenv("READ_SNAPSHOT_MAX_AGE_S", 3 * READ_SNAPSHOT_S))
+READ_SNAPSHOT_ROLLUP_1M_S = int(os.getenv("READ_SNAPSHOT_ROLLUP_1M_S", 3600))  # минутные агрегаты в снимке
+RECENT_ALERTS = 100  # столько последних переходов показывает /api/alerts
+
+# Сколько мс от момента снимка хранит каждая rollup-таблица
+ROLLUP_WINDOWS = {
+    "rollup_1m": READ_SNAPSHOT_ROLLUP_1M_S * 1000,
+    "rollup_1h": 25 * 60 * 60 * 1000,   # тренд за 24 часа и час на выравнивание интервалов
+}
+TABLES = ("device_latest", "alerts") + tuple(ROLLUP_WINDOWS)
+
+_COPY_ALERTS = '''
+    INSERT INTO alerts SELECT * FROM source.alerts
+    WHERE id IN (SELECT MAX(id) FROM source.alerts GROUP BY device_id, rule)
+       OR id IN (SELECT id FROM source.alerts ORDER BY ts DESC LIMIT ?)
+'''
+
+
+def snapshot_path():
+    base, _ext = os.path.splitext(db.DB_PATH)
+    return f"{base}.snapshot.db"
+
+
+def snapshot_age():
+    """Секунд с последнего снимка; бесконечность, если снимка нет."""
+    try:
+        return max(0.0, time.time() - os.stat(snapshot_path()).st_mtime)
+    except FileNotFoundError:
+        return math.inf
+
+
+def take_snapshot(path=None):
+    """Собирает снимок в path из таблиц основной базы. Возвращает время копирования, с."""
+    path = path or snapshot_path()
+    tmp = f"{path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)  # остаток прерванного снимка
+    started = time.perf_counter()
+    now = int(time.time() * 1000)
+    target = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        # Временный файл подменяется целиком, журнал ему не нужен
+        target.execute("PRAGMA journal_mode=OFF")
+        target.execute("PRAGMA synchronous=OFF")
+        target.execute("ATTACH DATABASE ? AS source", (db.DB_PATH,))
+        schema = target.execute(f'''
+            SELECT type, sql FROM source.sqlite_master
+            WHERE tbl_name IN ({", ".join("?" * len(TABLES))}) AND sql IS NOT NULL
+        ''', TABLES).fetchall()
+        for kind, sql in schema:
+            if kind == "table":
+                target.execute(sql)
+        # Одна читающая транзакция — таблицы снимка согласованы между собой (в WAL не мешает записи)
+        target.execute("BEGIN")
+        target.execute("INSERT INTO device_latest SELECT * FROM source.device_latest")
+        for table, window in ROLLUP_WINDOWS.items():
+            target.execute(f"INSERT INTO {table} SELECT * FROM source.{table} WHERE bucket >= ?",
+                           (now - window,))
+        target.execute(_COPY_ALERTS, (RECENT_ALERTS,))
+        target.execute("COMMIT")
+        target.execute("DETACH DATABASE source")
+        # Индексы — после вставки, одним проходом
+        for kind, sql in schema:
+            if kind == "index":
+                target.execute(sql)
+    finally:
+        target.close()
+    os.replace(tmp, path)
+    return time.perf_counter() - started
+
+
+class SnapshotStorage(SQLiteStorage):
+    """SQLiteStorage, у которой чтение основной базы идёт из снимка.
+
+    Соединение со снимком у каждого потока своё; при подмене файла
+    (новый inode) оно переоткрывается. Запись через этот объект не ведётся.
+    """
+
+    name = "sqlite-snapshot"
+
+    def __init__(self, path=None, max_age=READ_SNAPSHOT_MAX_AGE_S):
+        self.path = path or snapshot_path()
+        self.max_age = max_age
+        self._local = threading.local()
+        self._main = SQLiteStorage()   # для того, чего в снимке нет
+
+    def rollup_points(self, table, device_id, field, from_ts, to_ts, mode):
+        # Снимок хранит только последние ROLLUP_WINDOWS[table] мс; запас в один интервал — на выравнивание
+        if from_ts - rollups.ROLLUPS[table] < time.time() * 1000 - ROLLUP_WINDOWS[table]:
+            return self._main.rollup_points(table, device_id, field, from_ts, to_ts, mode)
+        return super().rollup_points(table, device_id, field, from_ts, to_ts, mode)
+
+    def recent_alerts(self, limit):
+        if limit > RECENT_ALERTS:
+            return self._main.recent_alerts(limit)
+        return super().recent_alerts(limit)
+
+    def _conn(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return db.get_connection()  # первый снимок ещё не снят
+        if self.max_age > 0 and time.time() - stat.st_mtime > self.max_age:
+            return db.get_connection()
+        inode, conn = getattr(self._local, "snapshot", (None, None))
+        if inode != stat.st_ino:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(f"file:{quote(self.path)}?immutable=1", uri=True,
+                                   cached_statements=db.DB_CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA mmap_size={db.DB_MMAP_SIZE}")
+            conn.execute(f"PRAGMA cache_size=-{db.DB_CACHE_SIZE_KB}")
+            self._local.snapshot = (stat.st_ino, conn)
+        return conn
+
+
+class SnapshotRefresher:
+    """Фоновый поток, обновляющий снимок раз в interval секунд.
+
+    Просыпается вдвое чаще interval и копирует базу, только если снимок
+    старше половины interval: из нескольких воркеров копирует тот, кто
+    первым взял блокировку, остальные видят свежий файл и пропускают ход.
+    """
+
+    def __init__(self, interval=READ_SNAPSHOT_S):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._refresh()  # первый снимок — до первого запроса
+            self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        with open(f"{db.DB_PATH}.snapshot.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None  # снимок сейчас снимает другой процесс
+            age = snapshot_age()
+            if age < self.interval / 2:
+                return None
+            return take_snapshot()
+
+    def _refresh(self):
+        try:
+            elapsed = self.run_once()
+            if elapsed is not None:
+                log.debug("📸 Снимок обновлён", extra={"ms": round(elapsed * 1000, 1)})
+        except Exception:
+            log.exception("❌ Ошибка снимка")
+
+    def _run(self):
+        while not self._stop.wait(self.interval / 2):
+            self._refresh()
+
+
+def open_reader(store):
+    """Хранилище для запросов дашборда: снимок при READ_SNAPSHOT_S > 0 и SQLite, иначе сам store."""
+    if READ_SNAPSHOT_S > 0 and isinstance(store, SQLiteStorage):
+        return SnapshotStorage()
+    return store
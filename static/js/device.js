@@ -0,0 +1,66 @@
+// Страница устройства: стрелка CO₂, температура и время последнего показания
+const REFRESH_MS = 30000;
+const MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+const deviceId = document.body.dataset.device;
+// Пороги зон задаёт сервер — те же, что у оповещений
+const WARN_PPM = parseFloat(document.body.dataset.co2WarnPpm);
+const HIGH_PPM = parseFloat(document.body.dataset.co2HighPpm);
+
+function pad(n) {
+    return String(n).padStart(2, '0');
+}
+
+// Зона по PPM: до WARN_PPM — зелёная, до HIGH_PPM — жёлтая, выше — красная
+function zone(ppm) {
+    if (ppm <= WARN_PPM) return { zone: '#00ff00', hand: 'var(--green-color)' };
+    if (ppm <= HIGH_PPM) return { zone: '#ffff00', hand: 'var(--yellow-color)' };
+    return { zone: '#ff1900', hand: 'var(--red-color)' };
+}
+
+function render(reading) {
+    // CO2 в % vol -> PPM, ограничено 0–2000; 2000 PPM = полный оборот стрелки
+    let ppm = reading.co2 !== null ? Math.trunc(reading.co2 * 10000) : 400;
+    ppm = Math.max(0, Math.min(2000, ppm));
+    const angle = (ppm / 2000) * 360;
+    const colors = zone(ppm);
+
+    const gauge = document.querySelector('.gauge');
+    gauge.style.setProperty('--zone-color', colors.zone);
+    gauge.style.setProperty('--hand-color', colors.hand);
+    document.querySelector('.hand').style.transform = `rotate(${angle}deg)`;
+    document.getElementById('co2-ppm').textContent = ppm;
+    document.getElementById('current-value').textContent = ppm;
+    document.getElementById('temperature').textContent = `${reading.temp !== null ? reading.temp : 24}°C`;
+
+    const d = new Date(reading.ts);
+    document.getElementById('time').textContent = `${pad(d.getUTCHours())}:${pad(d.getUTCMinutes())}`;
+    document.getElementById('date').textContent = `${MONTHS[d.getUTCMonth()]} ${pad(d.getUTCDate())}`;
+}
+
+async function refresh() {
+    try {
+        const response = await fetch(`/api/device/${encodeURIComponent(deviceId)}/latest`);
+        if (response.ok) render(await response.json());
+    } catch (e) {
+        console.error('Device refresh failed', e);
+    }
+}
+
+const body = document.querySelector('body'),
+      modeSwitch = document.querySelector('.switch-mode');
+
+modeSwitch.addEventListener('click', () => {
+    body.classList.toggle('dark');
+    const isDarkMode = body.classList.contains('dark');
+    modeSwitch.textContent = isDarkMode ? 'Light Mode' : 'Dark Mode';
+});
+
+// Новые показания приходят из /api/device/<id>/stream; без EventSource — опросом
+refresh();
+if (window.EventSource) {
+    const source = new EventSource(`/api/device/${encodeURIComponent(deviceId)}/stream`);
+    source.addEventListener('reading', (e) => render(JSON.parse(e.data)));
+    source.addEventListener('open', refresh);
+} else {
+    setInterval(refresh, REFRESH_MS);
+}
@@ -0,0 +1,280 @@
+// Главная страница: данные приходят из JSON API, разметка строится здесь
+const REFRESH_MS = 30000;
+const PAGE_SIZE = 200;
+const ROW_HEIGHT = 52;   // px, совпадает с высотой строки .device-table в index.css
+const OVERSCAN = 10;     // строк сверх видимых сверху и снизу
+// Пороги CO2 (% vol) задаёт сервер — те же, что у оповещений
+const CO2_WARN = parseFloat(document.body.dataset.co2Warn);
+const CO2_HIGH = parseFloat(document.body.dataset.co2High);
+const MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+
+function pad(n) {
+    return String(n).padStart(2, '0');
+}
+
+// То же, что strftime("%d %b %Y, %H:%M:%S") в UTC
+function formatTimestamp(ms) {
+    const d = new Date(ms);
+    return `${pad(d.getUTCDate())} ${MONTHS[d.getUTCMonth()]} ${d.getUTCFullYear()}, ` +
+        `${pad(d.getUTCHours())}:${pad(d.getUTCMinutes())}:${pad(d.getUTCSeconds())}`;
+}
+
+function el(tag, className, text) {
+    const node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text !== undefined) node.textContent = text;
+    return node;
+}
+
+function statusClass(status) {
+    if (status === 'VENT') return 'status-vent';
+    if (status === 'WARNING') return 'status-warning';
+    return 'status-good';
+}
+
+function co2Class(co2) {
+    if (co2 === null) return 'co2-normal';
+    if (co2 > CO2_HIGH) return 'co2-high';
+    if (co2 > CO2_WARN) return 'co2-medium';
+    return 'co2-normal';
+}
+
+function deviceRow(d) {
+    const row = el('tr');
+    row.style.cursor = 'pointer';
+    row.addEventListener('click', () => {
+        window.location.href = `/device/${encodeURIComponent(d.device_id)}/dashboard`;
+    });
+    row.append(
+        el('td', 'device-id', d.device_id),
+        el('td', 'timestamp', formatTimestamp(d.last_seen)),
+        el('td', `co2-value ${co2Class(d.co2)}`, d.co2 !== null ? d.co2 : '—'),
+        el('td', 'temp-value', d.temp !== null ? d.temp : '—'),
+    );
+    const status = el('td');
+    status.append(el('span', statusClass(d.status), d.status || '—'));
+    row.append(status, el('td', '', d.source_ip));
+    return row;
+}
+
+// === Список устройств ===
+// Страницы приходят из /api/devices по курсору (device_id последней строки),
+// следующая загружается, когда до конца загруженного остаётся меньше экрана.
+// В DOM только видимые строки и две строки-распорки, поэтому стоимость
+// отрисовки зависит от высоты экрана, а не от числа устройств.
+// reserved — сколько строк было до перезагрузки списка: высота таблицы сохраняется,
+// пока они не загрузятся снова, и прокрутка не сбрасывается
+const list = { devices: [], next: null, done: false, loading: null, generation: 0, filters: {}, reserved: 0 };
+let renderScheduled = false;
+
+function readFilters() {
+    const filters = {};
+    const status = document.getElementById('filter-status').value;
+    const co2 = document.getElementById('filter-co2').value;
+    const seen = document.getElementById('filter-seen').value;
+    if (status) filters.status = status;
+    if (co2 !== '' && !Number.isNaN(parseFloat(co2))) filters.co2_above = parseFloat(co2);
+    if (seen) filters.seen_within = parseInt(seen, 10);
+    return filters;
+}
+
+function matchesFilters(d) {
+    const f = list.filters;
+    if (f.status !== undefined && d.status !== f.status) return false;
+    if (f.co2_above !== undefined && !(d.co2 !== null && d.co2 > f.co2_above)) return false;
+    if (f.seen_within !== undefined && d.last_seen < Date.now() - f.seen_within * 1000) return false;
+    return true;
+}
+
+// Позиция device_id в отсортированном списке (двоичный поиск)
+function locate(deviceId) {
+    let low = 0, high = list.devices.length;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (list.devices[mid].device_id < deviceId) low = mid + 1;
+        else high = mid;
+    }
+    const found = low < list.devices.length && list.devices[low].device_id === deviceId;
+    return { index: low, found };
+}
+
+function loadPage() {
+    if (list.loading || list.done) return;
+    const params = new URLSearchParams({ limit: PAGE_SIZE, ...list.filters });
+    if (list.next !== null) params.set('after', list.next);
+    const generation = list.generation;
+    list.loading = getJSON(`/api/devices?${params}`).then(page => {
+        if (generation !== list.generation) return;  // фильтры сменились, ответ устарел
+        list.devices.push(...page.devices.filter(d => !locate(d.device_id).found));
+        list.next = page.next;
+        list.done = page.next === null;
+        if (list.done) list.reserved = 0;
+    }).catch(e => {
+        console.error('Device list refresh failed', e);
+    }).finally(() => {
+        if (generation !== list.generation) return;
+        list.loading = null;
+        scheduleRender();
+    });
+}
+
+function spacer(height) {
+    const row = el('tr', 'spacer');
+    const cell = el('td');
+    cell.colSpan = 6;
+    cell.style.height = `${height}px`;
+    row.append(cell);
+    return row;
+}
+
+function renderDevices() {
+    renderScheduled = false;
+    const scroller = document.getElementById('device-scroll');
+    const body = document.getElementById('device-rows');
+    const total = list.devices.length;
+    const count = document.getElementById('device-count');
+    count.textContent = `${total}${list.done ? '' : '+'} devices`;
+    if (!total && !list.reserved) {
+        const row = el('tr');
+        const cell = el('td', 'empty-row', list.done ? 'No data available' : 'Loading…');
+        cell.colSpan = 6;
+        row.append(cell);
+        body.replaceChildren(row);
+        loadPage();
+        return;
+    }
+    const visible = Math.ceil(scroller.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+    const first = Math.min(total, Math.max(0, Math.floor(scroller.scrollTop / ROW_HEIGHT) - OVERSCAN));
+    const last = Math.min(total, first + visible);
+    body.replaceChildren(
+        spacer(first * ROW_HEIGHT),
+        ...list.devices.slice(first, last).map(deviceRow),
+        spacer((Math.max(total, list.reserved) - last) * ROW_HEIGHT),
+    );
+    if (!list.done && (total - last < visible || total < list.reserved)) loadPage();
+}
+
+function scheduleRender() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(renderDevices);
+}
+
+// Список заново с первой страницы; keepScroll — после обрыва потока, иначе — новые фильтры
+function reloadDevices(keepScroll) {
+    list.generation += 1;
+    list.reserved = keepScroll ? Math.max(list.devices.length, list.reserved) : 0;
+    list.filters = readFilters();
+    list.devices = [];
+    list.next = null;
+    list.done = false;
+    list.loading = null;
+    if (!keepScroll) document.getElementById('device-scroll').scrollTop = 0;
+    scheduleRender();
+}
+
+// Обновление одной строки на месте; новое устройство вставляется по порядку device_id,
+// если попадает в уже загруженные страницы (иначе придёт со следующей страницей)
+function upsertDevice(d) {
+    const { index, found } = locate(d.device_id);
+    if (!matchesFilters(d)) {
+        if (found) list.devices.splice(index, 1);
+    } else if (found) {
+        list.devices[index] = d;
+    } else if (list.done || index < list.devices.length) {
+        list.devices.splice(index, 0, d);
+    } else {
+        return;
+    }
+    scheduleRender();
+}
+
+function renderStats(stats) {
+    document.getElementById('stat-total').textContent = stats.total_devices;
+    document.getElementById('stat-active').textContent = stats.active_devices;
+    document.getElementById('stat-alerts').textContent = stats.high_co2_alerts;
+    document.getElementById('stat-temp').textContent = `${stats.avg_temp}°C`;
+}
+
+function bar(className, heightPct, value, label) {
+    const node = el('div', `bar ${className}`);
+    node.style.height = `${heightPct}%`;
+    node.style.minHeight = '10px';
+    node.append(el('div', 'bar-value', value), el('div', 'bar-label', label));
+    return node;
+}
+
+function renderChart(id, points) {
+    const chart = document.getElementById(id);
+    if (!points.length) {
+        chart.replaceChildren(el('div', 'chart-empty', 'No trend data available'));
+        return;
+    }
+    chart.replaceChildren(...points);
+}
+
+function clamp(value) {
+    return Math.min(100, Math.max(10, Math.trunc(value)));
+}
+
+function renderTrend(trend) {
+    renderChart('co2-chart', trend.filter(dp => dp.co2 !== null).map(dp =>
+        bar('co2-bar', clamp(dp.co2 * 800), dp.co2.toFixed(2), dp.hour)));
+    renderChart('temp-chart', trend.filter(dp => dp.temp !== null).map(dp =>
+        bar('temp-bar', clamp((dp.temp - 15) * 10), `${Math.trunc(dp.temp)}°C`, dp.hour)));
+}
+
+async function getJSON(url) {
+    const response = await fetch(url);
+    if (!response.ok) throw new Error(`${url}: ${response.status}`);
+    return response.json();
+}
+
+async function refreshSummary() {
+    try {
+        const [stats, trend] = await Promise.all([getJSON('/api/stats'), getJSON('/api/trend')]);
+        renderStats(stats);
+        renderTrend(trend);
+    } catch (e) {
+        console.error('Dashboard refresh failed', e);
+    }
+}
+
+// Строки таблицы обновляются по событиям из /api/stream; без EventSource — опросом
+function connectStream() {
+    if (!window.EventSource) return false;
+    const source = new EventSource('/api/stream');
+    let opened = false;
+    source.addEventListener('reading', (e) => {
+        const r = JSON.parse(e.data);
+        upsertDevice({
+            device_id: r.device_id, last_seen: r.ts, co2: r.co2,
+            temp: r.temp, status: r.status, source_ip: r.source_ip,
+        });
+    });
+    // После переподключения перечитываем список — события за время обрыва потеряны
+    source.addEventListener('open', () => {
+        if (opened) reloadDevices(true);
+        opened = true;
+    });
+    return true;
+}
+
+function updateCurrentTime() {
+    const now = new Date();
+    document.getElementById('current-time').textContent = now.toLocaleString('en-US', {
+        year: 'numeric', month: 'short', day: 'numeric',
+        hour: '2-digit', minute: '2-digit', second: '2-digit'
+    });
+}
+
+updateCurrentTime();
+setInterval(updateCurrentTime, 1000);
+document.getElementById('device-scroll').addEventListener('scroll', scheduleRender, { passive: true });
+for (const id of ['filter-status', 'filter-co2', 'filter-seen']) {
+    document.getElementById(id).addEventListener('change', () => reloadDevices(false));
+}
+reloadDevices(false);
+refreshSummary();
+setInterval(refreshSummary, REFRESH_MS);
+if (!connectStream()) setInterval(() => reloadDevices(true), REFRESH_MS);
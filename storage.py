@@ -0,0 +1,432 @@
+"""Хранилище показаний: общий интерфейс и реализация на SQLite.
+
+app.py, writer.py и manage.py обращаются к БД только через объект Storage,
+который возвращает open_storage():
+
+    DATABASE_URL не задан          — SQLiteStorage: основная база db.py,
+                                     помесячные партиции logs (partitions.py);
+    DATABASE_URL=postgresql://...  — PostgresStorage (storage_pg.py): пул
+                                     соединений, COPY, TimescaleDB или BRIN.
+
+Строки logs везде — кортежи (device_id, ts, source_ip, co2, temp, status),
+ts — мс от эпохи UTC. Методы возвращают кортежи и словари, а не строки
+драйвера, поэтому вызывающему коду всё равно, какая БД внизу.
+"""
+import os
+import sqlite3
+import time
+
+import alerts
+import db
+import migrations
+import partitions
+import retention
+import rollups
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+LATEST_COLUMNS = "device_id, last_seen, source_ip, co2, temp, status"
+ALERT_COLUMNS = "device_id, rule, level, state, ts, value"
+DERIVED_WRITE_ATTEMPTS = 5   # попыток записать производные таблицы после записи партиции
+
+
+class PartialWriteError(Exception):
+    """Сырые строки пачки записаны, а производные таблицы — нет.
+
+    Пачку нельзя повторять или делить (retryable = False): строки logs задвоятся.
+    """
+
+    retryable = False
+
+
+class Storage:
+    """Операции, нужные приложению; реализации — SQLiteStorage и PostgresStorage."""
+
+    name = None
+    placeholder = "?"   # параметр в SQL драйвера
+
+    def _fetch(self, sql, params=()):
+        """Все строки запроса кортежами."""
+        raise NotImplementedError
+
+    def devices_page(self, after=None, limit=100, status=None, co2_above=None, seen_since=None):
+        """Страница последних показаний по device_id после after (keyset) с фильтрами.
+
+        Страница — диапазон по первичному ключу device_latest, поэтому её
+        стоимость зависит от limit, а не от числа устройств.
+        """
+        p = self.placeholder
+        where, params = [], []
+        for condition, value in ((f"device_id > {p}", after), (f"status = {p}", status),
+                                 (f"co2 > {p}", co2_above), (f"last_seen >= {p}", seen_since)):
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+        sql = f"SELECT {LATEST_COLUMNS} FROM device_latest"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._fetch(f"{sql} ORDER BY device_id LIMIT {p}", (*params, limit))
+
+    def migrate(self):
+        """Доводит схему до текущей версии; возвращает применённые версии."""
+        raise NotImplementedError
+
+    def insert_batch(self, rows, latest, alert_events=()):
+        """Пишет строки logs, последние показания устройств (latest), rollup-таблицы и переходы оповещений."""
+        raise NotImplementedError
+
+    def device_count(self):
+        raise NotImplementedError
+
+    def latest_per_device(self):
+        """Последнее показание каждого устройства, по device_id."""
+        raise NotImplementedError
+
+    def recent_devices(self, limit):
+        """Последние показания limit самых свежих устройств, от старых к новым."""
+        raise NotImplementedError
+
+    def latest(self, device_id):
+        raise NotImplementedError
+
+    def history(self, device_id, limit):
+        """Последние limit строк logs устройства, от новых к старым."""
+        raise NotImplementedError
+
+    def export_rows(self, device_id, from_ts, to_ts):
+        """Генератор строк logs в [from_ts, to_ts), всех устройств или одного (device_id)."""
+        raise NotImplementedError
+
+    def import_batches(self, batches, on_batch=None):
+        """Массовая загрузка пачек строк logs вместе с device_latest и rollup-таблицами.
+
+        Оповещения по загруженным строкам не вычисляются — это история, а не
+        новые показания. Пачка записывается целиком или не записывается:
+        on_batch(число строк) вызывается после каждой записанной, так что при
+        ошибке известно, с какой строки продолжить. Реализация по умолчанию
+        пишет каждую пачку через insert_batch. Возвращает число строк.
+        """
+        total = 0
+        for rows in batches:
+            latest = {}
+            for row in rows:
+                current = latest.get(row[0])
+                if current is None or row[1] >= current[1]:
+                    latest[row[0]] = row
+            self.insert_batch(rows, latest.values())
+            total += len(rows)
+            if on_batch:
+                on_batch(len(rows))
+        return total
+
+    def temp_buckets(self, since):
+        """(bucket, temp_sum, temp_count) минутных интервалов с since — для WindowStats."""
+        raise NotImplementedError
+
+    def trend(self, since):
+        """(час 'HH:00', средний co2, средняя temp) по rollup_1h с since."""
+        raise NotImplementedError
+
+    def raw_points(self, device_id, field, from_ts, to_ts):
+        """Генератор (ts, value) из logs в [from_ts, to_ts) по возрастанию ts."""
+        raise NotImplementedError
+
+    def rollup_points(self, table, device_id, field, from_ts, to_ts, mode):
+        """Генератор (bucket, value): среднее интервала или, для minmax, его min и max."""
+        raise NotImplementedError
+
+    def active_alerts(self):
+        raise NotImplementedError
+
+    def recent_alerts(self, limit):
+        raise NotImplementedError
+
+    def purge_raw(self, cutoff):
+        """Удаляет сырые показания старше cutoff (мс). Возвращает (партиций, строк)."""
+        raise NotImplementedError
+
+    def purge_rollup_1m(self, cutoff):
+        raise NotImplementedError
+
+    def size_bytes(self):
+        raise NotImplementedError
+
+    def rows_by_partition(self):
+        """[((партиция,), строк), ...] для метрики co2_logs_rows."""
+        raise NotImplementedError
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def migrate(self):
+        return migrations.migrate(db.get_connection())
+
+    def insert_batch(self, rows, latest, alert_events=()):
+        # Сырые строки — в помесячные партиции, производные таблицы — в основную базу.
+        # Это две транзакции, атомарность пачки ослаблена: производная часть при ошибке
+        # откатывается целиком, поэтому её повторяем, не трогая уже записанную партицию.
+        partitions.insert_rows(rows)
+        for attempt in range(DERIVED_WRITE_ATTEMPTS):
+            try:
+                self._insert_derived(rows, latest, alert_events)
+                return
+            except sqlite3.OperationalError as e:
+                # Блокировка, нехватка места и т. п. — может пройти
+                error = e
+                if attempt + 1 < DERIVED_WRITE_ATTEMPTS:
+                    time.sleep(0.1 * 2 ** attempt)
+            except sqlite3.Error as e:
+                error = e
+                break
+        raise PartialWriteError(f"rows written to partitions, derived tables failed: {error}") from error
+
+    def _insert_derived(self, rows, latest, alert_events):
+        conn = db.get_connection()
+        with conn:
+            conn.executemany(f'''
+                INSERT INTO device_latest ({LATEST_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_id) DO UPDATE SET
+                    last_seen = excluded.last_seen,
+                    source_ip = excluded.source_ip,
+                    co2 = excluded.co2,
+                    temp = excluded.temp,
+                    status = excluded.status
+                WHERE excluded.last_seen >= device_latest.last_seen
+            ''', latest)
+            rollups.update_rollups(conn, rows)
+            if alert_events:
+                conn.executemany(alerts.INSERT_SQL, alert_events)
+
+    def _conn(self):
+        """Соединение для чтения основной базы; SnapshotStorage (snapshot.py) подменяет его снимком."""
+        return db.get_connection()
+
+    def _fetch(self, sql, params=()):
+        return [tuple(row) for row in self._conn().execute(sql, params)]
+
+    def device_count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM device_latest').fetchone()[0]
+
+    def latest_per_device(self):
+        return self._fetch(f'SELECT {LATEST_COLUMNS} FROM device_latest ORDER BY device_id')
+
+    def recent_devices(self, limit):
+        return self._fetch(f'''
+            SELECT * FROM (
+                SELECT {LATEST_COLUMNS} FROM device_latest
+                ORDER BY last_seen DESC
+                LIMIT ?
+            ) AS recent ORDER BY last_seen
+        ''', (limit,))
+
+    def latest(self, device_id):
+        row = self._conn().execute(
+            f'SELECT {LATEST_COLUMNS} FROM device_latest WHERE device_id = ?', (device_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def history(self, device_id, limit):
+        history = []
+        # Обычно хватает текущего месяца; в более старые партиции идём только при нехватке строк
+        for key in partitions.partitions_for_range():
+            conn = partitions.connection(key)
+            if conn is None:
+                continue
+            history.extend(tuple(row) for row in conn.execute('''
+                SELECT device_id, ts, source_ip, co2, temp, status FROM logs
+                WHERE device_id = ?
+                ORDER BY ts DESC
+                LIMIT ?
+            ''', (device_id, limit - len(history))))
+            if len(history) >= limit:
+                break
+        return history
+
+    def temp_buckets(self, since):
+        return self._fetch('''
+            SELECT bucket, SUM(temp_sum), SUM(temp_count)
+            FROM rollup_1m
+            WHERE bucket >= ?
+            GROUP BY bucket
+        ''', (since,))
+
+    def trend(self, since):
+        return self._fetch('''
+            SELECT
+                strftime('%H:00', bucket / 1000, 'unixepoch') AS hour,
+                SUM(co2_sum) / NULLIF(SUM(co2_count), 0) AS avg_co2,
+                SUM(temp_sum) / NULLIF(SUM(temp_count), 0) AS avg_temp
+            FROM rollup_1h
+            WHERE bucket > ?
+            GROUP BY hour
+            ORDER BY hour
+        ''', (since,))
+
+    def raw_points(self, device_id, field, from_ts, to_ts):
+        # Курсор отдаёт строки по одной — весь диапазон в памяти не собирается
+        for key in partitions.partitions_for_range(from_ts, to_ts, newest_first=False):
+            conn = partitions.connection(key)
+            if conn is None:
+                continue
+            yield from conn.execute(f'''
+                SELECT ts, {field} FROM logs
+                WHERE device_id = ? AND ts >= ? AND ts < ? AND {field} IS NOT NULL
+                ORDER BY ts
+            ''', (device_id, from_ts, to_ts))
+
+    def rollup_points(self, table, device_id, field, from_ts, to_ts, mode):
+        size = rollups.ROLLUPS[table]
+        args = (device_id, from_ts - from_ts % size, to_ts)
+        where = f"WHERE device_id = ? AND bucket >= ? AND bucket < ? AND {field}_count > 0 ORDER BY bucket"
+        conn = self._conn()
+        if mode == "minmax":
+            # Экстремумы интервала сохраняются, а не усредняются
+            for bucket, low, high in conn.execute(
+                    f"SELECT bucket, {field}_min, {field}_max FROM {table} {where}", args):
+                yield bucket, low
+                yield bucket, high
+        else:
+            yield from conn.execute(f"SELECT bucket, {field}_sum / {field}_count FROM {table} {where}", args)
+
+    def export_rows(self, device_id, from_ts, to_ts):
+        # Все устройства — по idx_logs_ts, одно — по idx_logs_device_ts; без сортировки в памяти
+        where = "ts >= ? AND ts < ?" + (" AND device_id = ?" if device_id is not None else "")
+        params = (from_ts, to_ts) + ((device_id,) if device_id is not None else ())
+        for key in partitions.partitions_for_range(from_ts, to_ts, newest_first=False):
+            conn = partitions.connection(key)
+            if conn is None:
+                continue
+            yield from conn.execute(f'''
+                SELECT device_id, ts, source_ip, co2, temp, status FROM logs
+                WHERE {where}
+                ORDER BY ts
+            ''', params)
+
+    def import_batches(self, batches, on_batch=None):
+        """Загрузка в партиции отдельными соединениями, производные таблицы — в конце.
+
+        Партиции, которых до загрузки не было, заполняются без индексов, и
+        индексы строятся один раз в конце. device_latest и rollup-таблицы
+        считаются SQL-запросом по диапазонам id загруженных строк — так строки,
+        параллельно записанные приёмом, не учитываются дважды. Пачка на
+        границе месяцев пишется в несколько партиций; если одна из записей
+        не удалась, уже записанные части пачки удаляются.
+        """
+        conns, created, ranges = {}, set(), {}
+        total = 0
+        try:
+            for rows in batches:
+                by_key = {}
+                start = end = key = None
+                for row in rows:
+                    # Строки пачки обычно из одного месяца — ключ считается только на его границе
+                    if not (start is not None and start <= row[1] < end):
+                        key = partitions.partition_key(row[1])
+                        start, end = partitions.partition_bounds(key)
+                    by_key.setdefault(key, []).append(row)
+                written = []
+                try:
+                    for key, part_rows in by_key.items():
+                        conn = conns.get(key)
+                        if conn is None:
+                            path = partitions.partition_path(key)
+                            if not os.path.exists(path):
+                                created.add(key)
+                            conn = conns[key] = db.connect(path)
+                            partitions.create_schema(conn.cursor(), indexes=key not in created)
+                            conn.commit()
+                        with conn:
+                            conn.executemany(partitions.INSERT_SQL, part_rows)
+                            # Внутри транзакции записи id новых строк идут подряд
+                            last = conn.execute('SELECT MAX(id) FROM logs').fetchone()[0]
+                        written.append((key, last - len(part_rows), last))
+                except BaseException:
+                    for key, first, last in written:
+                        with conns[key]:
+                            conns[key].execute('DELETE FROM logs WHERE id > ? AND id <= ?', (first, last))
+                    raise
+                for key, first, last in written:
+                    spans = ranges.setdefault(key, [])
+                    if spans and spans[-1][1] == first:
+                        spans[-1][1] = last
+                    else:
+                        spans.append([first, last])
+                total += len(rows)
+                if on_batch:
+                    on_batch(len(rows))
+        finally:
+            for key, conn in conns.items():
+                if key in created:
+                    partitions.create_indexes(conn.cursor())
+                    conn.commit()
+                conn.close()
+            self._merge_imported(ranges)
+        return total
+
+    @staticmethod
+    def _merge_imported(ranges):
+        """Добавляет строки партиций с id в (first, last] в device_latest и rollup-таблицы."""
+        conn = db.connect()
+        try:
+            for key, spans in ranges.items():
+                conn.execute("ATTACH DATABASE ? AS part", (partitions.partition_path(key),))
+                try:
+                    with conn:
+                        for first, last in spans:
+                            rollups.merge(conn, "part.logs", "id > ? AND id <= ?", (first, last))
+                            # Остальные колонки при MAX(ts) SQLite берёт из строки с максимумом
+                            conn.execute(f'''
+                                INSERT INTO device_latest ({LATEST_COLUMNS})
+                                SELECT device_id, MAX(ts), source_ip, co2, temp, status
+                                FROM part.logs
+                                WHERE id > ? AND id <= ?
+                                GROUP BY device_id
+                                ON CONFLICT(device_id) DO UPDATE SET
+                                    last_seen = excluded.last_seen,
+                                    source_ip = excluded.source_ip,
+                                    co2 = excluded.co2,
+                                    temp = excluded.temp,
+                                    status = excluded.status
+                                WHERE excluded.last_seen >= device_latest.last_seen
+                            ''', (first, last))
+                finally:
+                    conn.execute("DETACH DATABASE part")
+        finally:
+            conn.close()
+
+    def active_alerts(self):
+        return [dict(row) for row in self._conn().execute(alerts.ACTIVE_SQL)]
+
+    def recent_alerts(self, limit):
+        return [dict(row) for row in self._conn().execute(
+            f'SELECT {ALERT_COLUMNS} FROM alerts ORDER BY ts DESC LIMIT ?', (limit,))]
+
+    def purge_raw(self, cutoff):
+        return retention.purge_raw(cutoff)
+
+    def purge_rollup_1m(self, cutoff):
+        return retention.purge_rollup_1m(cutoff)
+
+    def size_bytes(self):
+        paths = [db.DB_PATH] + [partitions.partition_path(key) for key in partitions.list_partitions()]
+        return sum(os.path.getsize(p) for path in paths for p in (path, path + "-wal") if os.path.exists(p))
+
+    def rows_by_partition(self):
+        # Точный COUNT(*): после импорта и очистки по ts в id бывают дыры, поэтому
+        # max(id) - min(id) завышает. SQLite считает по самому узкому индексу (ts)
+        result = []
+        for key in partitions.list_partitions():
+            conn = partitions.connection(key)
+            if conn is not None:
+                result.append(((key,), conn.execute('SELECT COUNT(*) FROM logs').fetchone()[0]))
+        return result
+
+
+def open_storage(url=None):
+    """Хранилище по DATABASE_URL: PostgreSQL для postgres(ql)://, иначе SQLite."""
+    url = url if url is not None else DATABASE_URL
+    if url and url.startswith(("postgres://", "postgresql://")):
+        from storage_pg import PostgresStorage
+        return PostgresStorage(url)
+    return SQLiteStorage()
@@ -0,0 +1,77 @@
+import pytest
+
+from alerts import AlertEngine, Rule
+
+SECOND_MS = 1000
+
+
+def engine(for_s=60):
+    return AlertEngine([Rule("co2_high", "co2", "critical", above=0.12, clear_below=0.10, for_s=for_s)])
+
+
+def readings(*points):
+    """(секунда, co2) -> строки logs одного устройства."""
+    return [("a", s * SECOND_MS, "ip", co2, 20, "OK") for s, co2 in points]
+
+
+def run(alert_engine, *points):
+    events, changes = alert_engine.evaluate(readings(*points))
+    alert_engine.apply(changes)
+    return [(event["state"], event["ts"] // SECOND_MS) for event in events]
+
+
+def test_fires_after_for_s():
+    e = engine()
+    assert run(e, (0, 0.13), (30, 0.13)) == []
+    assert len(e) == 0
+    assert run(e, (60, 0.14), (90, 0.15)) == [("firing", 60)]
+    assert len(e) == 1
+
+
+def test_blip_shorter_than_for_s_does_not_fire():
+    e = engine()
+    assert run(e, (0, 0.13), (30, 0.13), (45, 0.11), (70, 0.13), (100, 0.13)) == []
+    # Отсчёт начался заново с 70 с
+    assert run(e, (130, 0.13)) == [("firing", 130)]
+
+
+def test_resolves_only_below_clear_below_for_for_s():
+    e = engine()
+    assert run(e, (0, 0.13), (60, 0.13)) == [("firing", 60)]
+    # Между clear_below и above — гистерезис, оповещение остаётся
+    assert run(e, (100, 0.11), (200, 0.11), (300, 0.11)) == []
+    # Ниже clear_below, но недолго, — снова выше: отсчёт снятия сбрасывается
+    assert run(e, (310, 0.09), (340, 0.11), (360, 0.09), (400, 0.09)) == []
+    assert run(e, (420, 0.09)) == [("resolved", 420)]
+    assert len(e) == 0
+
+
+def test_for_s_zero_fires_and_resolves_immediately():
+    e = engine(for_s=0)
+    assert run(e, (0, 0.13), (1, 0.13), (2, 0.05), (3, 0.13)) == [("firing", 0), ("resolved", 2), ("firing", 3)]
+
+
+def test_evaluate_does_not_change_state_until_apply():
+    e = engine()
+    run(e, (0, 0.13))
+    events, changes = e.evaluate(readings((60, 0.13)))
+    assert [event["state"] for event in events] == ["firing"]
+    assert len(e) == 0
+    # Запись не удалась — повтор той же пачки даёт тот же переход
+    events_again, changes = e.evaluate(readings((60, 0.13)))
+    assert events_again == events
+    e.apply(changes)
+    assert len(e) == 1
+
+
+def test_load_restores_firing_rules():
+    e = engine()
+    e.load([{"device_id": "a", "rule": "co2_high", "ts": 0}, {"device_id": "a", "rule": "unknown", "ts": 0}])
+    assert len(e) == 1
+    assert run(e, (10, 0.13)) == []
+    assert run(e, (20, 0.05), (80, 0.05)) == [("resolved", 80)]
+
+
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError):
+        Rule("x", "humidity", "warning", above=1)
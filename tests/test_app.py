@@ -0,0 +1,45 @@
+"""HTTP API app.py на временной SQLite-базе (Flask test client)."""
+import time
+
+import pytest
+
+import db
+import partitions
+import storage
+from recent import Reading, RecentStore
+
+
+@pytest.fixture(scope="module")
+def web(tmp_path_factory):
+    # app.py открывает базу и греет кэши при импорте — DB_PATH задаётся до него
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db, "DB_PATH", str(tmp_path_factory.mktemp("app") / "co2_devices.db"))
+        mp.setattr(storage, "DATABASE_URL", None)
+        import app
+        yield app
+        app.close_ingest_queue()
+        partitions.close_connections()
+        db.close_connection()
+
+
+def test_device_history(web):
+    ts = int(time.time() * 1000)
+    rows = [("h1", ts + i, "ip", 0.04 + i / 1000, 20 + i, "OK") for i in range(5)]
+    web.save_rows_to_db(rows)
+    client = web.app.test_client()
+
+    response = client.get("/api/device/h1/history?limit=3")
+    assert response.status_code == 200
+    assert [reading["ts"] for reading in response.get_json()["readings"]] == [ts + 4, ts + 3, ts + 2]
+    # Без limit — вся глубина буфера, её хватает на все 5 строк
+    assert len(client.get("/api/device/h1/history").get_json()["readings"]) == 5
+
+    # Пустой буфер: история догружается из БД
+    web.recent_store = RecentStore(web.RECENT_PER_DEVICE, web.RECENT_MAX_DEVICES)
+    readings = client.get("/api/device/h1/history?limit=5").get_json()["readings"]
+    assert readings == [Reading(*row).as_dict() for row in reversed(rows)]
+    assert web.recent_store.history("h1", 5) is not None
+
+    assert client.get("/api/device/missing/history").status_code == 404
+    for limit in ("0", "x", str(web.RECENT_PER_DEVICE + 1)):
+        assert client.get(f"/api/device/h1/history?limit={limit}").status_code == 400
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+import downsample
+
+
+def series(n, start=0, step=1000, seed=1):
+    rnd = random.Random(seed)
+    return [(start + i * step, rnd.uniform(0, 1)) for i in range(n)]
+
+
+@pytest.mark.parametrize("mode", downsample.MODES)
+@pytest.mark.parametrize("n", [0, 1, 2, 20, 41])
+def test_short_series_returned_unchanged(mode, n):
+    points = series(n)
+    # Разреженный ряд в длинном диапазоне: корзин больше, чем точек, но и так точек не больше порога
+    assert list(downsample.downsample(iter(points), 0, 10 ** 7, 41, mode)) == points
+
+
+@pytest.mark.parametrize("mode", downsample.MODES)
+@pytest.mark.parametrize("n,threshold", [(42, 41), (1000, 3), (1000, 10), (10000, 500), (777, 100)])
+def test_output_length_within_threshold(mode, n, threshold):
+    points = series(n, start=-500)
+    result = list(downsample.downsample(iter(points), 0, n * 1000 - 500, threshold, mode))
+    assert 0 < len(result) <= threshold
+    assert result == sorted(result)
+    assert set(result) <= set(points)
+
+
+@pytest.mark.parametrize("n,threshold", [(42, 41), (1000, 3), (5000, 500)])
+def test_lttb_keeps_first_and_last(n, threshold):
+    points = series(n)
+    result = list(downsample.lttb(iter(points), 0, n * 1000, threshold))
+    assert result[0] == points[0]
+    assert result[-1] == points[-1]
+
+
+def test_minmax_keeps_peaks():
+    points = series(10000)
+    points[1234] = (points[1234][0], 5.0)
+    points[8765] = (points[8765][0], -5.0)
+    result = list(downsample.minmax(iter(points), 0, 10 ** 7, 100))
+    assert points[1234] in result and points[8765] in result
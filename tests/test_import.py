@@ -0,0 +1,68 @@
+"""python manage.py import: проверка файла до записи и продолжение с --skip-rows."""
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bulk
+import db
+import partitions
+import storage
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TS = 1769889600000   # 2026-01-31 20:00 UTC
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(bulk.COLUMNS)
+        writer.writerows(rows)
+
+
+def manage_import(tmp_path, *args):
+    env = dict(os.environ, DB_PATH=str(tmp_path / "co2_devices.db"), LOG_LEVEL="WARNING",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])))
+    env.pop("DATABASE_URL", None)
+    return subprocess.run([sys.executable, os.path.join(ROOT, "manage.py"), "import", *args],
+                          env=env, cwd=tmp_path, capture_output=True, text=True, timeout=120)
+
+
+@pytest.fixture
+def imported(tmp_path, monkeypatch):
+    def rows():
+        monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "co2_devices.db"))
+        try:
+            return sorted(tuple(row) for row in storage.SQLiteStorage().export_rows(None, 0, 2 ** 62))
+        finally:
+            partitions.close_connections()
+    return rows
+
+
+def test_bad_row_fails_before_anything_is_written(tmp_path, imported):
+    good = tmp_path / "good.csv"
+    write_csv(good, [("a", TS, "ip", 0.05, 20, "OK")])
+    bad = tmp_path / "bad.csv"
+    write_csv(bad, [("b", TS + i, "ip", 0.05, 20, "OK") for i in range(5)] + [("b", "oops", "ip", "", "", "")])
+    result = manage_import(tmp_path, str(good), str(bad), "--batch-rows", "2")
+    assert result.returncode != 0
+    assert "line 7" in result.stderr and "ничего не загружено" in result.stderr
+    assert imported() == []
+
+
+def test_resume_with_skip_rows_has_no_duplicates(tmp_path, imported):
+    rows = [("a", TS + i * 60000, "ip", 0.05, 20, "OK") for i in range(7)]
+    path = tmp_path / "logs.csv"
+    write_csv(path, rows[:5] + [("a", "oops", "ip", "", "", "")] + rows[5:])
+    # Без проверки плохая строка останавливает загрузку посреди файла
+    result = manage_import(tmp_path, str(path), "--batch-rows", "2", "--no-check")
+    assert result.returncode != 0
+    assert "загружено 4 строк" in result.stderr and "--skip-rows 4" in result.stderr
+    assert imported() == rows[:4]
+
+    write_csv(path, rows)   # строку исправили
+    result = manage_import(tmp_path, str(path), "--batch-rows", "2", "--skip-rows", "4")
+    assert result.returncode == 0, result.stderr
+    assert imported() == rows
@@ -0,0 +1,186 @@
+"""Одни и те же проверки интерфейса Storage для SQLiteStorage и PostgresStorage.
+
+SQLite — во временной папке. PostgreSQL — по TEST_DATABASE_URL (таблицы
+очищаются перед каждым тестом); без него, без psycopg2 или без сервера
+эти варианты пропускаются.
+
+    python -m pytest tests
+    TEST_DATABASE_URL=postgresql://postgres@localhost/co2_test python -m pytest tests
+"""
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+import alerts
+import db
+import partitions
+import retention
+import storage
+
+HOUR_MS = 60 * 60 * 1000
+JAN = int(datetime(2026, 1, 31, 20, tzinfo=timezone.utc).timestamp() * 1000)
+FEB = int(datetime(2026, 2, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "co2_devices.db"))
+    monkeypatch.setattr(retention, "RETENTION_BATCH_PAUSE_S", 0)
+    store = storage.SQLiteStorage()
+    store.migrate()
+    yield store
+    partitions.close_connections()
+    db.close_connection()
+
+
+@pytest.fixture
+def postgres_store(monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    pytest.importorskip("psycopg2")
+    import storage_pg
+
+    monkeypatch.setattr(retention, "RETENTION_BATCH_PAUSE_S", 0)
+    store = storage_pg.PostgresStorage(url)
+    try:
+        store.migrate()
+    except storage_pg.psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    with store._connection() as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE logs, device_latest, alerts, rollup_1m, rollup_1h")
+    yield store
+    store._get_pool()[0].closeall()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def store(request):
+    return request.getfixturevalue(f"{request.param}_store")
+
+
+def write(store, rows, alert_events=()):
+    latest = {}
+    for row in sorted(rows, key=lambda row: row[1]):
+        latest[row[0]] = row
+    store.insert_batch(rows, latest.values(), alert_events)
+
+
+def exported(store, device_id=None, from_ts=0, to_ts=2 ** 62):
+    return sorted(tuple(row) for row in store.export_rows(device_id, from_ts, to_ts))
+
+
+def test_insert_batch_updates_latest(store):
+    write(store, [("a", JAN, "10.0.0.1", 0.05, 21, "OK"), ("a", JAN + 1000, "10.0.0.1", 0.06, 22, "OK"),
+                  ("b", JAN, "10.0.0.2", None, None, "")])
+    write(store, [("a", JAN - 1000, "10.0.0.1", 0.01, 20, "OLD")])
+    assert store.device_count() == 2
+    assert tuple(store.latest("a")) == ("a", JAN + 1000, "10.0.0.1", 0.06, 22, "OK")
+    assert tuple(store.latest("b")) == ("b", JAN, "10.0.0.2", None, None, "")
+    assert store.latest("missing") is None
+    assert [row[0] for row in store.latest_per_device()] == ["a", "b"]
+    assert [row[0] for row in store.recent_devices(1)] == ["a"]
+    assert len(exported(store)) == 4
+
+
+def test_devices_page(store):
+    write(store, [(f"d{i:02}", JAN + i, "ip", i / 100, 20, "HIGH" if i % 2 else "OK") for i in range(10)])
+    first = store.devices_page(limit=4)
+    assert [row[0] for row in first] == ["d00", "d01", "d02", "d03"]
+    assert [row[0] for row in store.devices_page(after=first[-1][0], limit=4)] == ["d04", "d05", "d06", "d07"]
+    assert [row[0] for row in store.devices_page(after="d07", limit=4)] == ["d08", "d09"]
+    assert [row[0] for row in store.devices_page(status="HIGH", limit=3)] == ["d01", "d03", "d05"]
+    assert [row[0] for row in store.devices_page(co2_above=0.065)] == ["d07", "d08", "d09"]
+    assert [row[0] for row in store.devices_page(seen_since=JAN + 8)] == ["d08", "d09"]
+
+
+def test_history_newest_first_across_months(store):
+    write(store, [("a", JAN + i * HOUR_MS, "ip", 0.05, 20, "OK") for i in range(8)])
+    history = store.history("a", 5)
+    assert [row[1] for row in history] == [JAN + i * HOUR_MS for i in (7, 6, 5, 4, 3)]
+    assert all(row[0] == "a" for row in history)
+    assert store.history("missing", 5) == []
+
+
+def test_trend_and_rollup_points(store):
+    rows = [("a", JAN + m * 60 * 1000, "ip", 0.04 + m % 2 * 0.02, 20 + m % 2 * 2, "OK") for m in range(120)]
+    write(store, rows)
+    trend = store.trend(JAN - 1)
+    assert [hour for hour, _co2, _temp in trend] == ["20:00", "21:00"]
+    assert all(co2 == pytest.approx(0.05) and temp == pytest.approx(21) for _hour, co2, temp in trend)
+
+    points = list(store.rollup_points("rollup_1m", "a", "co2", JAN, JAN + 10 * 60 * 1000, "avg"))
+    assert [bucket for bucket, _ in points] == [JAN + m * 60 * 1000 for m in range(10)]
+    assert [value for _, value in points][:2] == [pytest.approx(0.04), pytest.approx(0.06)]
+    minmax = list(store.rollup_points("rollup_1h", "a", "temp", JAN, JAN + 2 * HOUR_MS, "minmax"))
+    assert minmax == [(JAN, 20), (JAN, 22), (JAN + HOUR_MS, 20), (JAN + HOUR_MS, 22)]
+    raw = list(store.raw_points("a", "co2", JAN, JAN + 3 * 60 * 1000))
+    assert [tuple(point) for point in raw] == [(row[1], row[3]) for row in rows[:3]]
+
+
+def test_export_rows_range_and_device(store):
+    rows = [(device, JAN + i * HOUR_MS, "ip", 0.05, 20, "OK") for i in range(6) for device in ("a", "b")]
+    write(store, rows)
+    assert exported(store) == sorted(rows)
+    assert exported(store, "a", JAN + HOUR_MS, JAN + 3 * HOUR_MS) == [rows[2], rows[4]]
+    # Одно устройство отдаётся по порядку времени
+    assert [row[1] for row in store.export_rows("b", 0, 2 ** 62)] == [JAN + i * HOUR_MS for i in range(6)]
+
+
+def test_import_batches(store):
+    rows = [("a", JAN + i * HOUR_MS, "ip", 0.05, 20, "OK") for i in range(6)]
+    assert store.import_batches([rows[:4], rows[4:]]) == 6
+    assert exported(store) == rows
+    assert tuple(store.latest("a")) == rows[-1]
+    assert len(list(store.rollup_points("rollup_1h", "a", "co2", JAN, JAN + 6 * HOUR_MS, "avg"))) == 6
+
+
+def test_import_batches_writes_whole_batches(store):
+    # Пачка через границу месяцев: строка февраля не пишется (NOT NULL), январская часть откатывается
+    done = []
+    good = [("a", JAN, "ip", 0.05, 20, "OK")]
+    with pytest.raises(Exception):
+        store.import_batches([good, [("a", JAN + 1, "ip", 0.05, 20, "OK"), ("a", FEB, None, 0.05, 20, "OK")]],
+                             done.append)
+    assert done == [1]
+    assert exported(store) == good
+    assert tuple(store.latest("a")) == good[0]
+
+
+def test_alerts(store):
+    firing = {"device_id": "a", "rule": "co2_high", "level": "critical", "state": "firing", "ts": JAN, "value": 0.2}
+    resolved = dict(firing, device_id="b", state="resolved", ts=JAN + 1)
+    write(store, [("a", JAN, "ip", 0.2, 20, "OK")], [firing, dict(resolved, state="firing", ts=JAN - 1), resolved])
+    assert store.active_alerts() == [firing]
+    assert [event["ts"] for event in store.recent_alerts(2)] == [JAN + 1, JAN]
+    engine = alerts.AlertEngine()
+    engine.load(store.active_alerts())
+    assert len(engine) == 1
+
+
+def test_purge_raw_and_rollup_1m(store):
+    rows = [("a", ts, "ip", 0.05, 20, "OK") for ts in (JAN, JAN + HOUR_MS, FEB, FEB + HOUR_MS, FEB + 2 * HOUR_MS)]
+    write(store, rows)
+    store.purge_raw(FEB + HOUR_MS)
+    assert exported(store) == rows[3:]
+    store.purge_rollup_1m(FEB)
+    assert [bucket for bucket, _sum, _count in sorted(store.temp_buckets(0))] == [ts for _, ts, *_ in rows[2:]]
+
+
+def test_rows_by_partition_counts_after_purge(sqlite_store):
+    # Ранняя по времени строка записана позже и получает больший id: очистка оставляет дыру
+    write(sqlite_store, [("a", FEB + 2 * HOUR_MS, "ip", 0.05, 20, "OK")])
+    write(sqlite_store, [("a", FEB, "ip", 0.05, 20, "OK")])
+    write(sqlite_store, [("a", FEB + 3 * HOUR_MS, "ip", 0.05, 20, "OK"), ("a", JAN, "ip", 0.05, 20, "OK")])
+    sqlite_store.purge_raw(FEB + HOUR_MS)
+    assert sqlite_store.rows_by_partition() == [(("202602",), 2)]
+
+
+def test_copy_escaping(store):
+    # COPY в PostgreSQL: табуляции, переводы строк и обратные слэши не должны ломать строку
+    odd = "a\tb\nc\\d\\N\r"
+    rows = [(odd, JAN, "ip\t1", 0.05, None, odd), ("\\N", JAN, "ip", None, 20, "\\")]
+    write(store, rows)
+    assert exported(store) == sorted(rows)
+    assert tuple(store.history(odd, 1)[0]) == rows[0]
+    assert tuple(store.latest("\\N")) == rows[1]
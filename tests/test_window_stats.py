@@ -0,0 +1,49 @@
+import time
+
+from window_stats import WindowStats
+
+MINUTE_MS = 60 * 1000
+
+
+def stats():
+    return WindowStats(window_ms=10 * MINUTE_MS, bucket_ms=MINUTE_MS, high_co2=0.09)
+
+
+def test_window_eviction():
+    now = int(time.time() * 1000)
+    ws = stats()
+    ws.add_rows([("a", now, "ip", 0.10, 20, "OK"), ("b", now - 5 * MINUTE_MS, "ip", 0.05, 30, "OK")])
+    assert ws.snapshot(now) == {"total_devices": 2, "active_devices": 2, "high_co2_alerts": 1, "avg_temp": 25}
+    # Корзина b выпала из окна: устройство известно, но не активно, его температура не учитывается
+    assert ws.snapshot(now + 6 * MINUTE_MS) == {
+        "total_devices": 2, "active_devices": 1, "high_co2_alerts": 1, "avg_temp": 20}
+    assert ws.snapshot(now + 12 * MINUTE_MS) == {
+        "total_devices": 2, "active_devices": 0, "high_co2_alerts": 0, "avg_temp": 0}
+
+
+def test_rows_older_than_window_only_count_as_known():
+    now = int(time.time() * 1000)
+    ws = stats()
+    ws.add_rows([("old", now - 20 * MINUTE_MS, "ip", 0.2, 40, "OK")])
+    assert ws.snapshot(now) == {"total_devices": 1, "active_devices": 0, "high_co2_alerts": 0, "avg_temp": 0}
+
+
+def test_device_counted_once_by_latest_reading():
+    now = int(time.time() * 1000)
+    ws = stats()
+    ws.add_rows([("a", now - 3 * MINUTE_MS, "ip", 0.2, 20, "OK")])
+    ws.add_rows([("a", now, "ip", 0.05, 22, "OK")])
+    # Устаревшее показание не меняет последнее
+    ws.add_rows([("a", now - 2 * MINUTE_MS, "ip", 0.3, None, "OK")])
+    snapshot = ws.snapshot(now)
+    assert (snapshot["active_devices"], snapshot["high_co2_alerts"]) == (1, 0)
+    assert snapshot["avg_temp"] == 21
+
+
+def test_load_restores_state():
+    now = int(time.time() * 1000)
+    bucket = now - now % MINUTE_MS
+    ws = stats()
+    ws.load([("a", now, 0.1), ("b", now - 30 * MINUTE_MS, 0.1)],
+            [(bucket, 50, 2), (bucket - 30 * MINUTE_MS, 100, 1)])
+    assert ws.snapshot(now) == {"total_devices": 2, "active_devices": 1, "high_co2_alerts": 1, "avg_temp": 25}
@@ -0,0 +1,66 @@
+"""Процесс-писатель (writer.py): перезапуск посреди потока пачек не теряет строк."""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import db
+import partitions
+import storage
+from writer import WriterClient
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def start_writer(path, db_path):
+    env = dict(os.environ, DB_PATH=db_path, LOG_LEVEL="WARNING", INGEST_WRITER_FLUSH_MS="50",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])))
+    env.pop("INGEST_WRITER_SOCKET", None)
+    process = subprocess.Popen([sys.executable, "-m", "writer", path], env=env, cwd=os.path.dirname(db_path))
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        assert process.poll() is None and time.monotonic() < deadline, "writer did not start"
+        time.sleep(0.05)
+    return process
+
+
+def stop_writer(process):
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(30) == 0
+
+
+def test_restart_mid_stream_loses_no_rows(tmp_path, monkeypatch):
+    path, db_path = str(tmp_path / "writer.sock"), str(tmp_path / "co2_devices.db")
+    process = start_writer(path, db_path)
+    # connect_timeout меньше простоя писателя: отправка должна ждать, а не бросать пачку
+    client = WriterClient(path, on_rows=lambda *args: None, connect_timeout=0.2)
+    ts = int(time.time() * 1000)
+    batches = [[(f"d{i % 7}", ts + i * 10 + j, "ip", 0.05, 20, "OK") for j in range(10)] for i in range(300)]
+    errors = []
+
+    def produce():
+        try:
+            for batch in batches:
+                client.send_rows(batch)
+                time.sleep(0.005)
+        except Exception as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    time.sleep(0.4)
+    stop_writer(process)
+    time.sleep(1)   # писатель недоступен дольше connect_timeout
+    process = start_writer(path, db_path)
+    producer.join(60)
+    assert not producer.is_alive() and not errors
+    stop_writer(process)
+
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    try:
+        rows = list(storage.SQLiteStorage().export_rows(None, 0, 2 ** 62))
+    finally:
+        partitions.close_connections()
+    assert len(rows) == sum(len(batch) for batch in batches)
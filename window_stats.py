@@ -0,0 +1,104 @@
+"""Карточки статистики в шапке главной страницы — без запросов к БД.
+
+Каждое записанное показание обновляет состояние за O(1):
+    - у устройства — время последнего показания и превышен ли порог CO2
+      по последнему показанию;
+    - у минутной корзины, где устройство видели в последний раз, — число
+      устройств и сколько из них с превышением (при новом показании
+      устройство переезжает в свежую корзину);
+    - у минутной корзины времени показания — сумма и число температур.
+Ответ — сумма по корзинам окна (их не больше window / bucket + 1), то есть
+тоже O(1). Окно, как и раньше, начинается с минуты, в которую попадает
+"сейчас минус window". При старте состояние собирается из device_latest и
+rollup_1m.
+"""
+import threading
+import time
+
+
+class WindowStats:
+    def __init__(self, window_ms=10 * 60 * 1000, bucket_ms=60 * 1000, high_co2=0.09):
+        self.window_ms = window_ms
+        self.bucket_ms = bucket_ms
+        self.high_co2 = high_co2
+        self._devices = {}   # device_id -> (корзина последнего показания, превышение)
+        self._seen = {}      # корзина -> [устройств, с превышением]
+        self._temp = {}      # корзина -> [сумма температур, число]
+        self._lock = threading.Lock()
+
+    def _bucket(self, ts):
+        return ts - ts % self.bucket_ms
+
+    def _since(self, now_ms=None):
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        return self._bucket(now_ms - self.window_ms)
+
+    def _is_high(self, co2):
+        return co2 is not None and co2 > self.high_co2
+
+    def _see(self, device_id, ts, co2, since):
+        bucket = self._bucket(ts)
+        high = self._is_high(co2)
+        previous = self._devices.get(device_id)
+        if previous is not None:
+            old_bucket, old_high = previous
+            if bucket < old_bucket:
+                return  # устаревшее показание не меняет последнее
+            counts = self._seen.get(old_bucket)
+            if counts is not None:
+                counts[0] -= 1
+                counts[1] -= old_high
+        self._devices[device_id] = (bucket, high)
+        if bucket >= since:
+            counts = self._seen.setdefault(bucket, [0, 0])
+            counts[0] += 1
+            counts[1] += high
+
+    def _prune(self, since):
+        # Корзин в окне немного, старые удаляются, как только выпадают из него
+        for buckets in (self._seen, self._temp):
+            if buckets and min(buckets) < since:
+                for bucket in [b for b in buckets if b < since]:
+                    del buckets[bucket]
+
+    def add_rows(self, rows):
+        """Строки logs: (device_id, ts, source_ip, co2, temp, status)."""
+        since = self._since()
+        with self._lock:
+            self._prune(since)
+            for device_id, ts, _ip, co2, temp, _status in rows:
+                self._see(device_id, ts, co2, since)
+                if temp is not None and ts >= since:
+                    sums = self._temp.setdefault(self._bucket(ts), [0, 0])
+                    sums[0] += temp
+                    sums[1] += 1
+
+    def load(self, latest_rows, temp_buckets):
+        """Начальное состояние: (device_id, last_seen, co2) и (bucket, temp_sum, temp_count)."""
+        since = self._since()
+        with self._lock:
+            self._devices.clear()
+            self._seen.clear()
+            self._temp.clear()
+            for device_id, last_seen, co2 in latest_rows:
+                self._see(device_id, last_seen, co2, since)
+            for bucket, temp_sum, temp_count in temp_buckets:
+                if bucket >= since and temp_count:
+                    self._temp[self._bucket(bucket)] = [temp_sum, temp_count]
+
+    def snapshot(self, now_ms=None):
+        since = self._since(now_ms)
+        with self._lock:
+            self._prune(since)
+            active = sum(counts[0] for counts in self._seen.values())
+            high = sum(counts[1] for counts in self._seen.values())
+            temp_sum = sum(sums[0] for sums in self._temp.values())
+            temp_count = sum(sums[1] for sums in self._temp.values())
+            total = len(self._devices)
+        avg_temp = temp_sum / temp_count if temp_count else None
+        return {
+            'total_devices': total,
+            'active_devices': active,
+            'high_co2_alerts': high,
+            'avg_temp': round(avg_temp, 1) if avg_temp else 0
+        }
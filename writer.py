@@ -0,0 +1,309 @@
+"""Единственный процесс-писатель для нескольких воркеров gunicorn.
+
+SQLite допускает одного писателя за раз: когда N воркеров сами пишут в БД,
+они по очереди ждут блокировку (busy_timeout) и коммитят мелкими пачками.
+Вместо этого воркеры отправляют свои пачки по Unix-сокету одному процессу,
+который владеет БД и коммитит крупными пачками через ту же очередь
+отложенной записи (ingest.py). Записанные строки писатель рассылает обратно
+всем воркерам вместе с переходами оповещений — так у каждого обновляются
+показания в памяти, кэш страниц и SSE-подписчики.
+
+Протокол — кадры "длина (4 байта, big-endian) + JSON": от воркера — список
+строк, от писателя — {"rows": [...], "alerts": [...], "seconds": время записи}.
+Своего /metrics у писателя нет: метрики записи по этим кадрам ведут воркеры.
+Процесс-писатель запускает gunicorn.conf.py, воркеры узнают путь
+к сокету из переменной окружения INGEST_WRITER_SOCKET.
+"""
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from log import get_logger
+
+log = get_logger("writer")
+
+WRITER_SOCKET_ENV = "INGEST_WRITER_SOCKET"
+WRITER_BATCH_ROWS = int(os.getenv("INGEST_WRITER_BATCH_ROWS", 5000))  # строк в одной транзакции писателя
+WRITER_FLUSH_MS = int(os.getenv("INGEST_WRITER_FLUSH_MS", 500))
+WRITER_QUEUE_SIZE = int(os.getenv("INGEST_WRITER_QUEUE_SIZE", 100000))
+WRITER_CLIENT_QUEUE = 1000  # пачек в очереди рассылки одному воркеру
+
+_HEADER = struct.Struct("!I")
+
+
+def send_frame(sock, message):
+    data = json.dumps(message, separators=(",", ":")).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """Следующий кадр (разобранный JSON) или None, если соединение закрыто."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+# === Сторона воркера ===
+class WriterClient:
+    """Соединение воркера с писателем.
+
+    send_rows подходит как flush_func для WriteBehindQueue воркера. Фоновый
+    поток принимает записанные строки, переходы оповещений и время записи и
+    передаёт их в on_rows(rows, alert_events, seconds); при обрыве соединения
+    он переподключается.
+    """
+
+    def __init__(self, path, on_rows, connect_timeout=10):
+        self.path = path
+        self.on_rows = on_rows
+        self.connect_timeout = connect_timeout
+        self._sock = None
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._give_up_at = None     # задаёт close(): после этого момента send_rows не ждёт писателя
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def send_rows(self, rows):
+        """Отправляет пачку целиком; пока писатель недоступен — ждёт его.
+
+        Клиентам этих строк уже ответили 200, поэтому пачку не бросаем: если
+        писатель занят или перезапускается, поток очереди воркера стоит здесь,
+        очередь заполняется и API отвечает 429. Сдаётся только после close().
+        """
+        waiting = False
+        while True:
+            try:
+                sock = self._connected()
+            except ConnectionError:
+                if self._give_up_at is not None and time.monotonic() >= self._give_up_at:
+                    raise
+                if not waiting:
+                    log.warning("⏳ Процесс-писатель недоступен, ждём", extra={"rows": len(rows)})
+                    waiting = True
+                continue
+            try:
+                with self._send_lock:
+                    send_frame(sock, rows)
+                return
+            except OSError:
+                self._drop(sock)
+
+    def close(self, timeout):
+        """Остановка воркера: send_rows ждёт писателя ещё не больше timeout секунд."""
+        with self._cond:
+            self._give_up_at = time.monotonic() + timeout
+            self._cond.notify_all()
+
+    def _ensure_started(self):
+        # Поток стартует лениво: после fork потоки родителя не живут
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="writer-client", daemon=True)
+            self._thread.start()
+
+    def _connected(self):
+        with self._cond:
+            self._ensure_started()
+            if self._sock is None:
+                timeout = self.connect_timeout
+                if self._give_up_at is not None:
+                    timeout = max(0, min(timeout, self._give_up_at - time.monotonic()))
+                self._cond.wait_for(lambda: self._sock is not None, timeout)
+            if self._sock is None:
+                raise ConnectionError(f"writer is not reachable at {self.path}")
+            return self._sock
+
+    def _drop(self, sock):
+        with self._cond:
+            if self._sock is sock:
+                self._sock = None
+        sock.close()
+
+    def _run(self):
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                time.sleep(0.5)
+                continue
+            with self._cond:
+                self._sock = sock
+                self._cond.notify_all()
+            try:
+                while True:
+                    message = recv_frame(sock)
+                    if message is None:
+                        break
+                    try:
+                        self.on_rows([tuple(row) for row in message["rows"]], message["alerts"], message["seconds"])
+                    except Exception:
+                        log.exception("❌ Ошибка обработки записанных строк")
+            except OSError:
+                pass
+            log.warning("⚠️ Соединение с процессом-писателем потеряно, переподключаемся")
+            self._drop(sock)
+            time.sleep(0.5)
+
+
+# === Сторона писателя ===
+class _Subscriber:
+    """Рассылка записанных строк одному воркеру из отдельного потока."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.outbox = queue.Queue(WRITER_CLIENT_QUEUE)
+        threading.Thread(target=self._run, name="writer-broadcast", daemon=True).start()
+
+    def push(self, message):
+        try:
+            self.outbox.put_nowait(message)
+        except queue.Full:
+            # Воркер не успевает читать — пропускаем пачку, страницы догонят по TTL
+            pass
+
+    def close(self):
+        self.outbox.put(None)
+
+    def _run(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            try:
+                send_frame(self.sock, message)
+            except OSError:
+                return
+
+
+class WriterServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, persist_func):
+        from ingest import WriteBehindQueue, QueueFull
+
+        self.QueueFull = QueueFull
+        self.persist_func = persist_func
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        self.queue = WriteBehindQueue(
+            self.flush,
+            max_size=WRITER_QUEUE_SIZE,
+            batch_rows=WRITER_BATCH_ROWS,
+            flush_interval=WRITER_FLUSH_MS / 1000,
+            split_failed=True,
+        )
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _WorkerHandler)
+
+    def flush(self, rows):
+        started = time.perf_counter()
+        alert_events = self.persist_func(rows) or []
+        message = {"rows": rows, "alerts": alert_events, "seconds": time.perf_counter() - started}
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(message)
+
+    def drain(self, timeout=10):
+        """Дочитывает пачки, уже отправленные воркерами, перед остановкой.
+
+        Писатель закрывает свою сторону соединений на запись; воркер видит
+        обрыв и закрывает соединение, а всё, что он успел отправить до этого,
+        обработчик ещё прочитает и поставит в очередь. Так остановка писателя
+        (например, перезапуск) не теряет пачек, на которые воркер уже не вернётся.
+        """
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self.subscribers and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def enqueue(self, rows):
+        # Очередь полна — не читаем сокет дальше, воркер упрётся в sendall
+        while True:
+            try:
+                self.queue.put_many(rows)
+                return
+            except self.QueueFull:
+                time.sleep(0.05)
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        subscriber = _Subscriber(self.request)
+        with self.server.subscribers_lock:
+            self.server.subscribers.add(subscriber)
+        try:
+            while True:
+                rows = recv_frame(self.request)
+                if rows is None:
+                    return
+                self.server.enqueue([tuple(row) for row in rows])
+        except OSError:
+            pass
+        finally:
+            with self.server.subscribers_lock:
+                self.server.subscribers.discard(subscriber)
+            subscriber.close()
+
+
+def serve(path):
+    """Точка входа процесса-писателя (запускается из gunicorn.conf.py)."""
+    # Сам писатель пишет в БД напрямую, а не через сокет
+    os.environ.pop(WRITER_SOCKET_ENV, None)
+    import app as web
+
+    server = WriterServer(path, web.persist_rows)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log.info("✍️ Процесс-писатель слушает", extra={"path": path})
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.drain()
+        server.queue.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        log.info("✍️ Процесс-писатель остановлен")
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])